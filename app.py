@@ -1,9 +1,15 @@
 import os
+from dataclasses import replace
+
 import streamlit as st
 from dotenv import load_dotenv, find_dotenv
 
+from src.agent.checkpoint import checkpointer, finish_run, new_thread_id, pending_nodes, saved_state
+from src.agent.config import RunConfig, graph_config
+from src.agent.dedupe import distinct_sources
 from src.agent.graph import build_graph
-from src.agent.state import AgentState
+from src.agent.state import AgentState, initial_state
+from src.agent.streaming import stream_run
 
 load_dotenv(find_dotenv(usecwd=True), override=True)
 
@@ -46,13 +52,22 @@ with st.sidebar:
         min_value=10, max_value=500,
         value=int(os.getenv("LANGGRAPH_RECURSION_LIMIT", "50")),
         key="recursion_limit",
+        help="Raised automatically when too low for the iteration count.",
     )
 
     st.caption("Tip: If your network blocks DDGS, turn research off.")
 
+    st.header("Resume")
+    resume_id = st.text_input(
+        "Interrupted run id",
+        value=st.session_state.get("interrupted_run", ""),
+        help="Continue a crashed or stopped run from its last completed node.",
+    )
+    resume_clicked = st.button("Resume run", disabled=not resume_id)
+
 # Cache graph in session
 if "graph" not in st.session_state:
-    st.session_state.graph = build_graph()
+    st.session_state.graph = build_graph(checkpointer())
 
 # Chat history
 if "messages" not in st.session_state:
@@ -62,56 +77,93 @@ for m in st.session_state.messages:
     with st.chat_message(m["role"]):
         st.markdown(m["content"])
 
+def run_and_render(state, thread_id: str):
+    # Stream one run (state=None continues the checkpointed thread) into the assistant message.
+    graph = st.session_state.graph
+    settings = state["settings"] if state else saved_state(graph, thread_id).get("settings")
+    run = replace(RunConfig.from_env(settings), recursion_limit=int(recursion_limit))
+    config = graph_config(run, thread_id if graph.checkpointer else None)
+    with st.chat_message("assistant"):
+        status = st.status("Thinking (Planner → Research → Draft → Critique → Revise)…")
+        live = st.empty()
+        checks = st.empty()
+        if graph.checkpointer:
+            st.caption(f"Run id: `{thread_id}`")
+
+        # Stream node transitions into the status box and draft/revision tokens into the message.
+        out = state
+        partial = ""
+        try:
+            for ev in stream_run(graph, state, config):
+                if ev.kind == "node_start":
+                    status.update(label=f"Running: {ev.node}…")
+                    status.write(f"→ {ev.node}")
+                    if ev.node in ("draft", "revise"):
+                        partial = ""
+                elif ev.kind == "token":
+                    partial += ev.text
+                    live.markdown(partial + "▌")
+                    if ev.citations:
+                        c = ev.citations
+                        checks.caption(
+                            f"Cited: {len(c.cited_ids)} sources · dangling: {', '.join(c.dangling_ids) or 'none'}"
+                            f" · uncited numeric claims: {c.uncited_numeric}"
+                        )
+                elif ev.kind == "done":
+                    out = ev.state
+        except Exception as e:
+            status.update(label="Interrupted", state="error")
+            if graph.checkpointer:
+                st.session_state.interrupted_run = thread_id
+                st.error(f"{type(e).__name__}: {e}\n\nUse **Resume run** with id `{thread_id}` to continue.")
+            else:
+                st.error(f"{type(e).__name__}: {e}")
+            return None
+        status.update(label="Done", state="complete")
+
+        answer = out.get("draft") or out.get("revision") or "(No output)"
+        live.markdown(answer)
+
+        sources = distinct_sources(out.get("sources", []) or [])
+        if sources:
+            st.markdown("### References")
+            for s in sources:
+                st.markdown(f"- **[{s['id']}]** [{s['title']}]({s['url']})")
+
+        with st.expander("Budget / Debug"):
+            st.write(out.get("budget", {}))
+
+    if graph.checkpointer:
+        finish_run(graph, thread_id)
+        if st.session_state.get("interrupted_run") == thread_id:
+            st.session_state.interrupted_run = ""
+    return answer
+
+
 user_q = st.chat_input("Ask a question…")  # Streamlit chat input pattern [web:420]
 if user_q:
-    # Apply config for this run (env var approach)
-    os.environ["RESEARCH_ENABLED"] = "1" if research_enabled else "0"
-    os.environ["MAX_ITERS"] = str(max_iters)
-    os.environ["BUDGET_MAX_SEARCH_CALLS"] = str(max_search_calls)
-    os.environ["BUDGET_MAX_PAGES_FETCHED"] = str(max_pages_fetched)
-
     st.session_state.messages.append({"role": "user", "content": user_q})
     with st.chat_message("user"):
         st.markdown(user_q)
 
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking (Planner → Research → Draft → Critique → Revise)…"):
-            state: AgentState = {
-                "question": user_q,
-                "plan": "",
-                "research_enabled": bool(research_enabled),
-                "sources": [],
-                "notes": "",
-                "draft": "",
-                "critique": "",
-                "revision": "",
-                "decision": "continue",
-                "iteration": 0,
-                "quality_score": 0,
-                "budget": {
-                    "search_calls": 0,
-                    "pages_fetched": 0,
-                    "token_estimate": 0,
-                    "stopped": False,
-                    "reasons": [],
-                },
-            }
-
-            out = st.session_state.graph.invoke(
-                state,
-                {"recursion_limit": int(recursion_limit)},
-            )
-
-            answer = out.get("draft") or out.get("revision") or "(No output)"
-            st.markdown(answer)
-
-            sources = out.get("sources", []) or []
-            if sources:
-                st.markdown("### References")
-                for s in sources:
-                    st.markdown(f"- **[{s['id']}]** [{s['title']}]({s['url']})")
-
-            with st.expander("Budget / Debug"):
-                st.write(out.get("budget", {}))
-
-    st.session_state.messages.append({"role": "assistant", "content": answer})
\ No newline at end of file
+    # Sidebar values travel with this run's state; the process environment is left untouched.
+    settings = {
+        "MAX_ITERS": int(max_iters),
+        "BUDGET_MAX_SEARCH_CALLS": int(max_search_calls),
+        "BUDGET_MAX_PAGES_FETCHED": int(max_pages_fetched),
+    }
+    state: AgentState = initial_state(user_q, bool(research_enabled), settings)
+    answer = run_and_render(state, new_thread_id())
+    if answer is not None:
+        st.session_state.messages.append({"role": "assistant", "content": answer})
+
+elif resume_clicked:
+    thread_id = resume_id.strip()
+    pending = pending_nodes(st.session_state.graph, thread_id)
+    if not pending:
+        st.warning(f"No resumable checkpoint for run `{thread_id}`.")
+    else:
+        st.info(f"Resuming run `{thread_id}` at: {', '.join(pending)}")
+        answer = run_and_render(None, thread_id)
+        if answer is not None:
+            st.session_state.messages.append({"role": "assistant", "content": answer})
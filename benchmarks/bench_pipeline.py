@@ -0,0 +1,183 @@
+'''
+Offline end-to-end benchmark of build_graph() with stubbed LLM, search and HTTP backends.
+
+    python -m benchmarks.bench_pipeline --runs 5 --concurrency 1,4,8
+
+Reports per-node and end-to-end latency (sequential runs), throughput under concurrency
+(asyncio + graph.ainvoke) and peak memory (a separate pass at the highest concurrency level,
+since tracemalloc slows everything down). Caches are disabled unless --warm-cache is given,
+so every run exercises the full search / fetch / LLM path.
+'''
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import time
+import tracemalloc
+
+from .fakes import FakeChatModel, FixtureDDGS, serve_fixture_pages, FIXTURES
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+def _load_questions() -> list[str]:
+    with open(os.path.join(FIXTURES, "questions.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def install_fakes(args) -> str:
+    '''Point the agent at the local stand-ins. Returns the fixture server's base URL.'''
+    from src.agent import nodes, search
+
+    _, base_url = serve_fixture_pages()
+    FixtureDDGS.base_url = base_url
+    FixtureDDGS.latency_ms = args.search_ms
+    search.DDGS = FixtureDDGS
+    nodes._LLMS.clear()
+    nodes._make_llm = lambda cfg, model: FakeChatModel(
+        model=model,
+        temperature=cfg.temperature,
+        base_ms=args.llm_base_ms,
+        prefill_ms_per_kchar=args.llm_prefill_ms,
+        decode_ms_per_token=args.llm_decode_ms,
+    )
+    return base_url
+
+
+def bench_sequential(graph, questions: list[str], runs: int) -> dict:
+    from src.agent.config import RunConfig, graph_config
+    from src.agent.state import initial_state
+    from src.agent.tracing import span_key, start_trace
+
+    config = graph_config(RunConfig.from_env())
+
+    e2e, per_node, per_call = [], {}, {}
+    for i in range(runs):
+        tracer = start_trace(f"bench-{i}")
+        t0 = time.perf_counter()
+        graph.invoke(initial_state(questions[i % len(questions)], True), config)
+        e2e.append(time.perf_counter() - t0)
+        for s in tracer.spans:
+            bucket = per_node if s["kind"] == "node" else per_call
+            bucket.setdefault(span_key(s), []).append(s["dur_ms"])
+    return {
+        "runs": runs,
+        "e2e_secs": {
+            "mean": statistics.mean(e2e),
+            "p50": statistics.median(e2e),
+            "p95": _percentile(e2e, 0.95),
+        },
+        # Mean milliseconds per call, plus total milliseconds per run.
+        "nodes_ms": {k: {"mean": statistics.mean(v), "per_run": sum(v) / runs} for k, v in sorted(per_node.items())},
+        "calls_ms": {k: {"mean": statistics.mean(v), "per_run": sum(v) / runs} for k, v in sorted(per_call.items())},
+    }
+
+
+async def _bench_concurrent(graph, questions: list[str], concurrency: int, total: int) -> dict:
+    from src.agent.config import RunConfig, graph_config
+    from src.agent.state import initial_state
+
+    config = graph_config(RunConfig.from_env())
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with sem:
+            t0 = time.perf_counter()
+            await graph.ainvoke(initial_state(questions[i % len(questions)], True), config)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    wall = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "runs": total,
+        "wall_secs": wall,
+        "runs_per_min": total / wall * 60,
+        "p50_secs": statistics.median(latencies),
+        "p95_secs": _percentile(latencies, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the research graph.")
+    parser.add_argument("--runs", type=int, default=5, help="sequential runs for latency breakdown")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs first (client setup, imports)")
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--runs-per-worker", type=int, default=2, help="runs per worker at each concurrency level")
+    parser.add_argument("--max-iters", type=int, default=2)
+    parser.add_argument("--llm-base-ms", type=float, default=20.0)
+    parser.add_argument("--llm-prefill-ms", type=float, default=2.0, help="ms per 1000 prompt chars")
+    parser.add_argument("--llm-decode-ms", type=float, default=0.5, help="ms per generated token")
+    parser.add_argument("--search-ms", type=float, default=5.0)
+    parser.add_argument("--warm-cache", action="store_true", help="keep the page/search/LLM caches enabled")
+    parser.add_argument("--json", help="also write the report to this path")
+    args = parser.parse_args()
+
+    os.environ["MAX_ITERS"] = str(args.max_iters)
+    os.environ["RESEARCH_ENABLED"] = "1"
+    os.environ["STREAM_OUTPUT"] = "0"
+    # Budgets large enough that every run goes through the full loop.
+    os.environ["BUDGET_MAX_TOKEN_ESTIMATE"] = "1000000"
+    os.environ["BUDGET_MAX_SEARCH_CALLS"] = "100"
+    os.environ["BUDGET_MAX_PAGES_FETCHED"] = "100"
+    if not args.warm_cache:
+        os.environ["LLM_CACHE"] = "off"
+        os.environ["PAGE_CACHE_ENABLED"] = "0"
+        os.environ["SEARCH_CACHE_ENABLED"] = "0"
+
+    install_fakes(args)
+    from src.agent.graph import build_graph
+
+    graph = build_graph()
+    questions = _load_questions()
+    if args.warmup:
+        bench_sequential(graph, questions, args.warmup)
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    report = {"sequential": bench_sequential(graph, questions, args.runs), "concurrent": []}
+    for level in levels:
+        report["concurrent"].append(
+            asyncio.run(_bench_concurrent(graph, questions, level, level * args.runs_per_worker))
+        )
+
+    tracemalloc.start()
+    asyncio.run(_bench_concurrent(graph, questions, max(levels), max(levels) * args.runs_per_worker))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report["memory"] = {
+        "concurrency": max(levels),
+        "tracemalloc_peak_mb": peak / 2**20,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+    seq = report["sequential"]
+    print(f"\n----- SEQUENTIAL ({seq['runs']} runs) -----")
+    print("end-to-end: mean {mean:.3f}s  p50 {p50:.3f}s  p95 {p95:.3f}s".format(**seq["e2e_secs"]))
+    for title, rows in (("nodes", seq["nodes_ms"]), ("calls", seq["calls_ms"])):
+        print(f"{title}:")
+        for name, v in rows.items():
+            print(f"  {name:<44} mean {v['mean']:9.2f} ms   per run {v['per_run']:9.2f} ms")
+    print("\n----- CONCURRENT (graph.ainvoke) -----")
+    for c in report["concurrent"]:
+        print(
+            f"  c={c['concurrency']:<3} runs={c['runs']:<4} {c['runs_per_min']:9.1f} runs/min   "
+            f"p50 {c['p50_secs']:.3f}s  p95 {c['p95_secs']:.3f}s"
+        )
+    print("\n----- MEMORY -----")
+    print("  c={concurrency}: tracemalloc peak {tracemalloc_peak_mb:.1f} MB   max RSS {max_rss_mb:.1f} MB".format(**report["memory"]))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+'''
+Deterministic local stand-ins for the agent's external dependencies:
+- FakeChatModel: a LangChain chat model with a configurable latency model (no Ollama needed)
+- FixtureDDGS: replaces ddgs.DDGS and answers from fixtures/search.json
+- serve_fixture_pages: a local HTTP server for the recorded pages in fixtures/pages/
+'''
+import asyncio
+import functools
+import hashlib
+import http.server
+import json
+import os
+import threading
+import time
+from typing import Any, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+_DRAFT = """## Overview
+LangGraph models an agent as a graph whose nodes are functions and whose edges decide what runs next [S1].
+Cycles let the agent call a tool, inspect the result and try again [S1].
+
+## Reflexion
+Reflexion stores a natural-language critique of each attempt and reads it on the next try [S2].
+The 2023 paper reported HumanEval pass@1 rising from 80 to 91 percent [S2].
+
+## Running locally
+Ollama serves local models over HTTP on port 11434 [S3].
+An 8B model at 4-bit needs about 5 GB of memory and generates 20 to 40 tokens per second.
+
+## Caveats
+Free search backends rate-limit heavy use, so cache queries [S4].
+"""
+
+
+def _revised_section(prompt: str) -> str:
+    # Echo the section back with a citation added to its uncited numeric lines.
+    section = prompt.split("\nSection:\n", 1)[1].split("\n\nCritique:\n", 1)[0]
+    return "\n".join(
+        f"{line} [S3]" if any(ch.isdigit() for ch in line) and "[S" not in line and not line.startswith("#") else line
+        for line in section.splitlines()
+    )
+
+
+def _response_for(prompt: str) -> str:
+    # Route on the module prompt headers in src/agent/prompts.py.
+    if "planning module" in prompt:
+        return "- Identify key concepts\n- Search for primary sources\n- Fetch 2-3 pages\n- Summarise with citations\n- Note uncertainty"
+    if "search query generator" in prompt:
+        return "langgraph reflexion local agents\nollama quantised models throughput\nsearch backend rate limits caching"
+    if "research synthesis module" in prompt:
+        return (
+            "- LangGraph supports cyclic graphs for agent loops [S1]\n"
+            "- Reflexion improves agents through verbal self-critique [S2]\n"
+            "- Ollama runs quantised models locally [S3]\n"
+            "- Search backends rate-limit heavy use [S4]\n"
+            "Uncertainty: hardware throughput numbers vary by GPU."
+        )
+    if "fixing one section" in prompt:
+        return _revised_section(prompt)
+    if "critique module" in prompt:
+        return "quality_score: 6\nThe draft is well structured but one numeric claim lacks a citation.\n- ## Running locally: add [S#] to the hardware line"
+    return _DRAFT
+
+
+class FakeChatModel(BaseChatModel):
+    '''
+    Latency model per call: base_ms + prefill_ms_per_kchar * prompt_kchars + decode_ms_per_token * output_tokens.
+    Reports Ollama-style token counts in usage/response metadata.
+    '''
+    model: str = "fake-8b"
+    temperature: float = 0.2
+    base_ms: float = 20.0
+    prefill_ms_per_kchar: float = 2.0
+    decode_ms_per_token: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> tuple[float, ChatResult]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = _response_for(prompt)
+        prompt_tokens, output_tokens = max(1, len(prompt) // 4), max(1, len(text) // 4)
+        delay = (
+            self.base_ms
+            + self.prefill_ms_per_kchar * len(prompt) / 1000
+            + self.decode_ms_per_token * output_tokens
+        ) / 1000
+        message = AIMessage(
+            content=text,
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens},
+            response_metadata={"model": self.model, "prompt_eval_count": prompt_tokens, "eval_count": output_tokens},
+        )
+        return delay, ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        delay, result = self._respond(messages)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        delay, result = self._respond(messages)
+        await asyncio.sleep(delay)
+        return result
+
+
+class FixtureDDGS:
+    '''Drop-in for ddgs.DDGS: deterministic, query-dependent ordering of the fixture results.'''
+
+    base_url = ""
+    latency_ms = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def text(self, query: str, region=None, safesearch=None, timelimit=None, max_results: int = 5):
+        with open(os.path.join(FIXTURES, "search.json"), encoding="utf-8") as f:
+            entries = json.load(f)
+        entries.sort(key=lambda e: hashlib.sha1((query + e["path"]).encode()).hexdigest())
+        time.sleep(self.latency_ms / 1000)
+        return [
+            {"title": e["title"], "href": self.base_url + e["path"], "body": e["body"]}
+            for e in entries[:max_results]
+        ]
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_fixture_pages() -> tuple[http.server.ThreadingHTTPServer, str]:
+    '''Serve fixtures/pages on an ephemeral localhost port. Returns (server, base_url).'''
+    handler = functools.partial(_QuietHandler, directory=os.path.join(FIXTURES, "pages"))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
@@ -0,0 +1,399 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from .utils import env_int
+
+# Singletons are resolved from env on first use; _UNSET until then, None when disabled.
+_UNSET = object()
+_PAGE_CACHE = _UNSET
+_SEARCH_CACHE = _UNSET
+_LLM_CACHE = _UNSET
+_CONTENT_STORE = None
+_CACHE_LOCK = threading.Lock()
+
+
+class CachedPage(NamedTuple):
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()
+
+
+_EVICT_BATCH = 32
+
+
+def _track_bytes(db: sqlite3.Connection, table: str):
+    # A one-row `meta` table holds the running SUM(size) of `table`, kept by triggers in the same
+    # transaction as each insert/delete, so eviction checks never scan the (large) table.
+    db.execute("CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+    db.execute(f"INSERT OR IGNORE INTO meta (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM {table}")
+    db.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_bytes_add AFTER INSERT ON {table} "
+        "BEGIN UPDATE meta SET bytes = bytes + NEW.size WHERE id = 0; END"
+    )
+    db.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_bytes_del AFTER DELETE ON {table} "
+        "BEGIN UPDATE meta SET bytes = bytes - OLD.size WHERE id = 0; END"
+    )
+
+
+def _evict_lru(db: sqlite3.Connection, max_bytes: int, victims_sql: str, drop):
+    # Caller holds the lock and an open transaction. While the tracked total is over the cap,
+    # drop(rows) removes the next batch of least recently used rows selected by `victims_sql`.
+    while db.execute("SELECT bytes FROM meta WHERE id = 0").fetchone()[0] > max_bytes:
+        victims = db.execute(victims_sql, (_EVICT_BATCH,)).fetchall()
+        if not victims:
+            break
+        drop(victims)
+
+
+class PageCache:
+    '''
+    Persistent, content-addressed page cache (SQLite).
+    - `pages` maps a URL to the hash of its extracted text plus validators (ETag / Last-Modified).
+    - `blobs` stores each distinct text once, so mirrors of the same page share storage.
+    Entries older than `ttl_secs` are stale and must be revalidated; when the blobs exceed
+    `max_bytes`, the least recently used pages are evicted.
+    '''
+
+    def __init__(self, path: str, ttl_secs: int, max_bytes: int):
+        self.path = path
+        self.ttl_secs = ttl_secs
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, hash TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+                "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS pages_lru ON pages(accessed_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS pages_hash ON pages(hash)")
+            _track_bytes(self._db, "blobs")
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT b.text, p.etag, p.last_modified, p.fetched_at FROM pages p "
+                "JOIN blobs b ON b.hash = p.hash WHERE p.url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            with self._db:
+                self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, url))
+        text, etag, last_modified, fetched_at = row
+        return CachedPage(text, etag, last_modified, now - fetched_at < self.ttl_secs)
+
+    def refresh(self, url: str):
+        # Origin answered 304 Not Modified: the cached copy is fresh again.
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+
+    def put(self, url: str, text: str, etag: str = None, last_modified: str = None):
+        now = time.time()
+        h = content_hash(text)
+        with self._lock, self._db:
+            old = self._db.execute("SELECT hash FROM pages WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR IGNORE INTO blobs (hash, text, size) VALUES (?, ?, ?)",
+                (h, text, len(text.encode("utf-8", "replace"))),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, hash, etag, last_modified, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, h, etag, last_modified, now, now),
+            )
+            if old is not None and old[0] != h:
+                self._drop_orphans([old])
+            self._evict()
+
+    def iter_pages(self):
+        '''Yields (url, text) for every cached page (e.g. to build a local search index).'''
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT p.url, b.text FROM pages p JOIN blobs b ON b.hash = p.hash ORDER BY p.url"
+            ).fetchall()
+        yield from rows
+
+    def _drop_orphans(self, hashes: list):
+        # Caller holds the lock and an open transaction. Blobs no page points to any more.
+        self._db.executemany(
+            "DELETE FROM blobs WHERE hash = ?1 AND NOT EXISTS (SELECT 1 FROM pages WHERE hash = ?1)", hashes
+        )
+
+    def _evict(self):
+        # Caller holds the lock and an open transaction.
+        def drop(victims):
+            self._db.executemany("DELETE FROM pages WHERE url = ?", [(url,) for url, _ in victims])
+            self._drop_orphans([(h,) for _, h in victims])
+
+        _evict_lru(self._db, self.max_bytes, "SELECT url, hash FROM pages ORDER BY accessed_at LIMIT ?", drop)
+
+
+class KVCache:
+    '''
+    Small persistent key -> JSON value cache (SQLite) with a TTL and an LRU bound on entry count.
+    '''
+
+    def __init__(self, path: str, ttl_secs: int, max_entries: int):
+        self.path = path
+        self.ttl_secs = ttl_secs
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS kv_lru ON kv(accessed_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM kv WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with self._db:
+                if now - row[1] >= self.ttl_secs:
+                    self._db.execute("DELETE FROM kv WHERE key = ?", (key,))
+                    return None
+                self._db.execute("UPDATE kv SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO kv (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            n = self._db.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+            if n > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY accessed_at LIMIT ?)",
+                    (n - self.max_entries,),
+                )
+
+
+class MemoryLRU:
+    '''In-process LRU tier (bounded entry count).'''
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+class ContentStore:
+    '''
+    Content-addressed page text for running research sessions. AgentState keeps only each
+    source's content hash and length, so node transitions and checkpoints don't copy page text;
+    nodes load it when they build a prompt.
+    A byte-bounded in-memory LRU sits in front of an optional SQLite file (`path`, LRU-evicted
+    beyond `max_bytes`), which lets a checkpointed run resume in a new process with its text.
+    get() returns None for text that was evicted; callers fetch the page again.
+    '''
+
+    def __init__(self, memory_bytes: int, path: str = "", max_bytes: int = 0):
+        self.memory_bytes = memory_bytes
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db:
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS content ("
+                    "hash TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS content_lru ON content(accessed_at)")
+                _track_bytes(self._db, "content")
+
+    def put(self, text: str) -> str:
+        h = content_hash(text)
+        with self._lock:
+            self._remember(h, text)
+            if self._db is not None:
+                with self._db:
+                    # An upsert, not INSERT OR REPLACE: REPLACE's implicit delete skips the bytes trigger.
+                    self._db.execute(
+                        "INSERT INTO content (hash, text, size, accessed_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(hash) DO UPDATE SET accessed_at = excluded.accessed_at",
+                        (h, text, len(text.encode("utf-8", "replace")), time.time()),
+                    )
+                    self._evict()
+        return h
+
+    def get(self, h: str) -> Optional[str]:
+        if not h:
+            return None
+        with self._lock:
+            if h in self._items:
+                self._items.move_to_end(h)
+                return self._items[h]
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT text FROM content WHERE hash = ?", (h,)).fetchone()
+            if row is None:
+                return None
+            with self._db:
+                self._db.execute("UPDATE content SET accessed_at = ? WHERE hash = ?", (time.time(), h))
+            self._remember(h, row[0])
+            return row[0]
+
+    def _remember(self, h: str, text: str):
+        # Caller holds the lock. Sizes are in characters, close enough for a memory bound.
+        if h in self._items:
+            self._items.move_to_end(h)
+            return
+        self._items[h] = text
+        self._size += len(text)
+        while self._size > self.memory_bytes and len(self._items) > 1:
+            _, old = self._items.popitem(last=False)
+            self._size -= len(old)
+
+    def _evict(self):
+        # Caller holds the lock and an open transaction.
+        _evict_lru(
+            self._db, self.max_bytes, "SELECT hash FROM content ORDER BY accessed_at LIMIT ?",
+            lambda victims: self._db.executemany("DELETE FROM content WHERE hash = ?", victims),
+        )
+
+
+class ResponseCache:
+    '''
+    LLM response cache made of pluggable tiers (anything with get/put), checked in order.
+    A hit in a slower tier is copied into the faster ones.
+    '''
+
+    def __init__(self, tiers: list):
+        self.tiers = tiers
+
+    @staticmethod
+    def key(model: str, temperature: float, prompt: str) -> str:
+        raw = json.dumps([model, temperature, content_hash(prompt)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster in self.tiers[:i]:
+                    faster.put(key, value)
+                return value
+        return None
+
+    def put(self, key: str, value: str):
+        for tier in self.tiers:
+            tier.put(key, value)
+
+
+def page_cache() -> Optional[PageCache]:
+    '''Process-wide page cache, or None when PAGE_CACHE_ENABLED=0.'''
+    global _PAGE_CACHE
+    if _PAGE_CACHE is _UNSET:
+        with _CACHE_LOCK:
+            if _PAGE_CACHE is _UNSET:
+                _PAGE_CACHE = None if os.getenv("PAGE_CACHE_ENABLED", "1") != "1" else PageCache(
+                    path=os.getenv("PAGE_CACHE_PATH", ".cache/pages.sqlite"),
+                    ttl_secs=env_int("PAGE_CACHE_TTL_SECS", 86400),
+                    max_bytes=env_int("PAGE_CACHE_MAX_MB", 200) * 1024 * 1024,
+                )
+    return _PAGE_CACHE
+
+
+def search_cache() -> Optional[KVCache]:
+    '''Process-wide search-result cache, or None when SEARCH_CACHE_ENABLED=0.'''
+    global _SEARCH_CACHE
+    if _SEARCH_CACHE is _UNSET:
+        with _CACHE_LOCK:
+            if _SEARCH_CACHE is _UNSET:
+                _SEARCH_CACHE = None if os.getenv("SEARCH_CACHE_ENABLED", "1") != "1" else KVCache(
+                    path=os.getenv("SEARCH_CACHE_PATH", ".cache/search.sqlite"),
+                    ttl_secs=env_int("SEARCH_CACHE_TTL_SECS", 21600),
+                    max_entries=env_int("SEARCH_CACHE_MAX_ENTRIES", 5000),
+                )
+    return _SEARCH_CACHE
+
+
+def llm_cache() -> Optional[ResponseCache]:
+    '''
+    Process-wide LLM response cache built from LLM_CACHE:
+    "tiered" (memory + SQLite, default), "memory", "sqlite" or "off".
+    '''
+    global _LLM_CACHE
+    if _LLM_CACHE is _UNSET:
+        with _CACHE_LOCK:
+            if _LLM_CACHE is _UNSET:
+                mode = os.getenv("LLM_CACHE", "tiered").lower()
+                tiers = []
+                if mode in ("tiered", "memory"):
+                    tiers.append(MemoryLRU(env_int("LLM_CACHE_MEMORY_ENTRIES", 256)))
+                if mode in ("tiered", "sqlite"):
+                    tiers.append(KVCache(
+                        path=os.getenv("LLM_CACHE_PATH", ".cache/llm.sqlite"),
+                        ttl_secs=env_int("LLM_CACHE_TTL_SECS", 7 * 86400),
+                        max_entries=env_int("LLM_CACHE_MAX_ENTRIES", 20000),
+                    ))
+                _LLM_CACHE = None if mode == "off" else ResponseCache(tiers)
+    return _LLM_CACHE
+
+
+def content_store() -> ContentStore:
+    '''
+    Process-wide store for source text (always on: AgentState only holds hashes).
+    CONTENT_STORE_PATH="" keeps it in memory only.
+    '''
+    global _CONTENT_STORE
+    if _CONTENT_STORE is None:
+        with _CACHE_LOCK:
+            if _CONTENT_STORE is None:
+                _CONTENT_STORE = ContentStore(
+                    memory_bytes=env_int("CONTENT_STORE_MEMORY_MB", 64) * 1024 * 1024,
+                    path=os.getenv("CONTENT_STORE_PATH", ".cache/content.sqlite"),
+                    max_bytes=env_int("CONTENT_STORE_MAX_MB", 500) * 1024 * 1024,
+                )
+    return _CONTENT_STORE
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Optional
+
+_SAVER = None
+_SAVER_LOCK = threading.Lock()
+
+
+def checkpointer():
+    '''
+    Process-wide SQLite checkpoint saver, or None when CHECKPOINT_ENABLED=0.
+    LangGraph writes the full state after every completed node, keyed by thread id,
+    so an interrupted run can continue from the last finished node instead of starting over.
+    '''
+    global _SAVER
+    if os.getenv("CHECKPOINT_ENABLED", "1") != "1":
+        return None
+    with _SAVER_LOCK:
+        if _SAVER is None:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+
+            path = os.getenv("CHECKPOINT_PATH", ".cache/checkpoints.sqlite")
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # The saver serializes access with its own lock; Streamlit reruns use other threads.
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            _SAVER = SqliteSaver(conn)
+    return _SAVER
+
+
+def new_thread_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def saved_state(graph, thread_id: str) -> dict:
+    '''Last checkpointed state of a run ({} if there is none).'''
+    if graph.checkpointer is None:
+        return {}
+    return graph.get_state({"configurable": {"thread_id": thread_id}}).values or {}
+
+
+def pending_nodes(graph, thread_id: str) -> Optional[tuple]:
+    '''
+    Nodes a checkpointed run would execute next: None if the thread is unknown,
+    () if it already finished, otherwise the node(s) to resume from.
+    '''
+    if graph.checkpointer is None:
+        return None
+    snapshot = graph.get_state({"configurable": {"thread_id": thread_id}})
+    if not snapshot.values:
+        return None
+    return tuple(snapshot.next)
+
+
+def finish_run(graph, thread_id: str):
+    # Completed runs are not resumable, so drop their checkpoints unless asked to keep them.
+    if graph.checkpointer is not None and os.getenv("CHECKPOINT_KEEP_COMPLETED", "0") != "1":
+        graph.checkpointer.delete_thread(thread_id)
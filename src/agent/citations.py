@@ -0,0 +1,146 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, NamedTuple, Optional
+
+# All patterns are compiled once at import; analysis is a single pass over the lines.
+MARKER = re.compile(r"\[S(\d+)\]")
+# Sentence ends: . ! or ? followed by whitespace/end (so "3.5" and "v1.2" don't split), not after
+# common abbreviations, together with any [S#] markers placed right after the full stop.
+_END = re.compile(
+    r"([.!?]+(?<!\be\.g\.)(?<!\bi\.e\.)(?<!\bvs\.)(?<!\bcf\.)(?<!\bal\.)(?<!\bfig\.)(?<!\bapprox\.)"
+    r"(?:\s*\[S\d+\])*)(?=\s|$)",
+    re.IGNORECASE,
+)
+_LIST_PREFIX = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+")
+_DIGIT = re.compile(r"\d")
+_FENCE = "```"
+
+
+class Claim(NamedTuple):
+    line: int  # 1-based line number in the analyzed text
+    text: str
+    cited: tuple  # source ids cited by this sentence, e.g. ("S1", "S3")
+    numeric: bool  # mentions a number, year, date or quantity outside its citation markers
+
+
+@dataclass
+class CitationReport:
+    claims: list = field(default_factory=list)
+    cited_ids: list = field(default_factory=list)  # every id cited, in order of first use
+    dangling_ids: list = field(default_factory=list)  # cited ids that match no known source
+    uncited_numeric: list = field(default_factory=list)  # numeric claims without a marker
+
+    @property
+    def has_citations(self) -> bool:
+        return bool(self.cited_ids)
+
+
+def _line_claims(number: int, line: str) -> list:
+    # split() with the terminator captured yields [sentence, end, sentence, end, ..., rest].
+    parts = _END.split(_LIST_PREFIX.sub("", line, count=1))
+    parts.append("")
+    claims = []
+    for i in range(0, len(parts) - 1, 2):
+        sentence = (parts[i] + parts[i + 1]).strip()
+        if not sentence:
+            continue
+        if "[S" in sentence:
+            cited = tuple(f"S{n}" for n in MARKER.findall(sentence))
+            numeric = bool(_DIGIT.search(MARKER.sub("", sentence))) if cited else bool(_DIGIT.search(sentence))
+        else:
+            cited, numeric = (), bool(_DIGIT.search(sentence))
+        claims.append(Claim(number, sentence, cited, numeric))
+    return claims
+
+
+class CitationStatus(NamedTuple):
+    claims: int
+    cited_ids: tuple
+    dangling_ids: tuple
+    uncited_numeric: int
+
+
+class CitationScanner:
+    '''
+    Incremental citation analysis for streamed text: feed() chunks as they arrive and each line
+    is analyzed once, when it is complete. status() is the cheap per-chunk summary; report()
+    has every claim so far. Both include the unfinished last line. Headings and fenced code
+    blocks are not claims.
+    '''
+
+    def __init__(self, source_ids: Optional[Iterable[str]] = None):
+        self.source_ids = None if source_ids is None else set(source_ids)
+        # Aggregates are kept up to date as lines complete, so status() costs O(current line + cited
+        # ids); report() also copies the claim lists, O(claims).
+        self._claims = []
+        self._cited = {}
+        self._uncited = []
+        self._partial = ""
+        self._lines = 0
+        self._in_code = False
+
+    def feed(self, chunk: str):
+        if "\n" not in chunk:
+            self._partial += chunk
+            return
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            claims = self._scan(line)
+            if claims:
+                self._add(claims, self._claims, self._cited, self._uncited)
+
+    @staticmethod
+    def _add(claims: list, into: list, cited: dict, uncited: list):
+        into.extend(claims)
+        for claim in claims:
+            if claim.cited:
+                cited.update(dict.fromkeys(claim.cited))
+            elif claim.numeric:
+                uncited.append(claim)
+
+    def _scan(self, line: str) -> list:
+        self._lines += 1
+        stripped = line.lstrip()
+        if stripped.startswith(_FENCE):
+            self._in_code = not self._in_code
+            return []
+        if self._in_code or not stripped or stripped.startswith("#"):
+            return []
+        return _line_claims(self._lines, line)
+
+    def _peek(self) -> list:
+        # Claims of the unfinished line, without consuming it.
+        if not self._partial.strip():
+            return []
+        in_code, lines = self._in_code, self._lines
+        claims = self._scan(self._partial)
+        self._in_code, self._lines = in_code, lines
+        return claims
+
+    def status(self) -> CitationStatus:
+        partial = self._peek()
+        cited = dict(self._cited)
+        uncited = len(self._uncited)
+        for claim in partial:
+            if claim.cited:
+                cited.update(dict.fromkeys(claim.cited))
+            elif claim.numeric:
+                uncited += 1
+        dangling = () if self.source_ids is None else tuple(i for i in cited if i not in self.source_ids)
+        return CitationStatus(len(self._claims) + len(partial), tuple(cited), dangling, uncited)
+
+    def report(self) -> CitationReport:
+        claims, cited, uncited = list(self._claims), dict(self._cited), list(self._uncited)
+        self._add(self._peek(), claims, cited, uncited)
+
+        cited_ids = list(cited)
+        dangling = [] if self.source_ids is None else [i for i in cited_ids if i not in self.source_ids]
+        return CitationReport(claims=claims, cited_ids=cited_ids, dangling_ids=dangling, uncited_numeric=uncited)
+
+
+def analyze(text: str, source_ids: Optional[Iterable[str]] = None) -> CitationReport:
+    '''Citation report for a complete text; `source_ids` (e.g. "S1") enables dangling-id checks.'''
+    scanner = CitationScanner(source_ids)
+    scanner.feed(text or "")
+    return scanner.report()
@@ -0,0 +1,211 @@
+import os
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Any, Dict
+
+# Settings a caller may override for a single run (AgentState["settings"], server jobs,
+# Streamlit sidebar), keyed by their env var names.
+RUN_SETTINGS = (
+    "OLLAMA_MODEL",
+    "OLLAMA_MODEL_SMALL",
+    "OLLAMA_TEMPERATURE",
+    "MAX_ITERS",
+    "EARLY_STOP_MIN_SCORE",
+    "BUDGET_MAX_SEARCH_CALLS",
+    "BUDGET_MAX_PAGES_FETCHED",
+    "BUDGET_MAX_TOKEN_ESTIMATE",
+    "REQUIRE_CITATIONS_WHEN_RESEARCH_ENABLED",
+)
+
+
+# Nodes that call the LLM (and their trace span names); MODEL_ROUTES assigns them a model.
+LLM_NODES = ("planner", "query_writer", "research", "draft", "critique", "revise")
+
+
+def _env(name: str, default):
+    return field(default=default, metadata={"env": name})
+
+
+@dataclass(frozen=True)
+class RunConfig:
+    '''
+    Everything the nodes read from the environment, resolved once per run.
+    Carried in LangGraph's config (config["configurable"]["run_config"]), so concurrent runs
+    with different models/budgets don't interfere and nodes never parse env vars themselves.
+    '''
+
+    # Model
+    model: str = _env("OLLAMA_MODEL", "llama3.1:8b-instruct-q4_K_M")
+    base_url: str = _env("OLLAMA_BASE_URL", "http://localhost:11434")
+    temperature: float = _env("OLLAMA_TEMPERATURE", 0.2)
+    llm_cache_max_temperature: float = _env("LLM_CACHE_MAX_TEMPERATURE", 0.3)
+    num_ctx: int = _env("OLLAMA_NUM_CTX", 8192)
+    # Per-node routing: "node=small" uses OLLAMA_MODEL_SMALL (OLLAMA_MODEL while that is unset),
+    # "node=default" OLLAMA_MODEL, anything else is taken as a model name.
+    small_model: str = _env("OLLAMA_MODEL_SMALL", "")
+    model_routes: str = _env("MODEL_ROUTES", "planner=small,query_writer=small,critique=small")
+    # How long Ollama keeps each model loaded after a request, so routed models aren't swapped out
+    keep_alive: str = _env("OLLAMA_KEEP_ALIVE", "30m")
+
+    # Token accounting
+    tokenizer_path: str = _env("TOKENIZER_PATH", "")
+    reserve_output_tokens: int = _env("PROMPT_RESERVE_OUTPUT_TOKENS", 1024)
+
+    # Loop control
+    max_iters: int = _env("MAX_ITERS", 3)
+    early_stop_min_score: int = _env("EARLY_STOP_MIN_SCORE", 8)
+    # Adaptive stop (guards.StopController): minimum score gain per iteration, and what one quality
+    # point is worth in iteration wall time / tokens (0 turns a cost check off)
+    stop_min_gain: float = _env("STOP_MIN_GAIN", 0.5)
+    stop_secs_per_point: float = _env("STOP_SECS_PER_POINT", 120.0)
+    stop_tokens_per_point: int = _env("STOP_TOKENS_PER_POINT", 0)
+    # Raised to fit max_iters when set lower (see graph_config)
+    recursion_limit: int = _env("LANGGRAPH_RECURSION_LIMIT", 50)
+
+    # Budget
+    max_search_calls: int = _env("BUDGET_MAX_SEARCH_CALLS", 6)
+    max_pages_fetched: int = _env("BUDGET_MAX_PAGES_FETCHED", 6)
+    max_token_estimate: int = _env("BUDGET_MAX_TOKEN_ESTIMATE", 12000)
+    max_chars_per_page: int = _env("BUDGET_MAX_CHARS_PER_PAGE", 12000)
+
+    # Search / fetch
+    ddg_region: str = _env("DDG_REGION", "wt-wt")
+    ddg_safesearch: str = _env("DDG_SAFESEARCH", "moderate")
+    ddg_time_limit: str = _env("DDG_TIME_LIMIT", "y")
+    ddg_max_results: int = _env("DDG_MAX_RESULTS", 5)
+    http_timeout_secs: int = _env("HTTP_TIMEOUT_SECS", 15)
+    # Comma-separated fallback chain, e.g. "local,ddgs" (see search.PROVIDERS)
+    search_providers: str = _env("SEARCH_PROVIDERS", "ddgs")
+    search_timeout_secs: float = _env("SEARCH_TIMEOUT_SECS", 10.0)
+
+    # Research queries fanned out per iteration
+    research_queries: int = _env("RESEARCH_QUERIES", 3)
+    # Start the next iteration's searches/fetches while revise is still generating
+    speculative_research: bool = _env("SPECULATIVE_RESEARCH", True)
+    # Wall-clock limit on the speculative page fetches (decide waits for them)
+    prefetch_deadline_secs: float = _env("PREFETCH_DEADLINE_SECS", 10.0)
+
+    # Research context
+    research_chunk_chars: int = _env("RESEARCH_CHUNK_CHARS", 800)
+    research_top_k_chunks: int = _env("RESEARCH_TOP_K_CHUNKS", 12)
+    research_context_tokens: int = _env("RESEARCH_CONTEXT_TOKENS", 3000)
+    research_digest_chars: int = _env("RESEARCH_DIGEST_CHARS", 400)
+    research_notes_context_tokens: int = _env("RESEARCH_NOTES_CONTEXT_TOKENS", 600)
+    # Max SimHash distance (bits of 64) at which two fetched pages count as near-duplicates
+    dedupe_max_distance: int = _env("DEDUPE_MAX_DISTANCE", 3)
+
+    # Quality gate
+    require_citations: bool = _env("REQUIRE_CITATIONS_WHEN_RESEARCH_ENABLED", True)
+
+    # Revision: "sections" regenerates only the sections the gate/critique flagged, "full" the whole draft
+    revise_mode: str = _env("REVISE_MODE", "sections")
+
+    def model_for(self, node: str) -> str:
+        route = _routes(self.model_routes).get(node, "default")
+        if route == "small":
+            return self.small_model or self.model
+        if route == "default":
+            return self.model
+        return route
+
+    @classmethod
+    def from_env(cls, overrides: Dict[str, Any] = None) -> "RunConfig":
+        '''
+        Reads every field from its env var (bad values fall back to the default, like env_int),
+        then applies `overrides` (keys from RUN_SETTINGS). Invalid overrides raise ValueError.
+        '''
+        overrides = overrides or {}
+        unknown = sorted(set(overrides) - set(RUN_SETTINGS))
+        if unknown:
+            raise ValueError(f"unknown settings: {', '.join(unknown)} (allowed: {', '.join(RUN_SETTINGS)})")
+
+        values = {}
+        for f in fields(cls):
+            name = f.metadata["env"]
+            if name in overrides and overrides[name] is not None:
+                try:
+                    values[f.name] = _coerce(overrides[name], f.default)
+                except (TypeError, ValueError):
+                    raise ValueError(f"setting {name} must be {_KINDS[type(f.default)]}")
+                continue
+            raw = os.getenv(name)
+            if raw is None:
+                continue
+            try:
+                values[f.name] = _coerce(raw, f.default)
+            except (TypeError, ValueError):
+                pass
+        return cls(**values)
+
+
+@lru_cache(maxsize=32)
+def _routes(spec: str) -> dict:
+    routes = {}
+    for item in spec.split(","):
+        node, sep, target = item.partition("=")
+        if sep and node.strip() and target.strip():
+            routes[node.strip()] = target.strip()
+    return routes
+
+
+_KINDS = {bool: "a boolean", int: "an integer", float: "a number", str: "a string"}
+
+
+_TRUE = ("1", "true", "yes", "on")
+_FALSE = ("0", "false", "no", "off", "")
+
+
+def parse_bool(value) -> bool:
+    '''Booleans from env/JSON: true/false, 1/0, "yes"/"no", "on"/"off"; anything else raises ValueError.'''
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in _TRUE + _FALSE:
+        return value.strip().lower() in _TRUE
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _coerce(value, default):
+    if isinstance(default, bool):
+        return parse_bool(value)
+    if isinstance(default, int):
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return str(value)
+
+
+# Supersteps per Reflexion iteration in graph.build_graph:
+# research, draft, critique ∥ gate, review, revise ∥ prefetch, decide.
+STEPS_PER_ITERATION = 6
+
+
+def min_recursion_limit(max_iters: int) -> int:
+    # The planner, every iteration, and a little headroom.
+    return 1 + STEPS_PER_ITERATION * max(1, max_iters) + 4
+
+
+def graph_config(run: RunConfig, thread_id: str = None) -> dict:
+    '''
+    LangGraph config for one run; the thread id selects a checkpoint history.
+    The recursion limit is never below what MAX_ITERS iterations need.
+    '''
+    configurable = {"run_config": run}
+    if thread_id:
+        configurable["thread_id"] = thread_id
+    limit = max(run.recursion_limit, min_recursion_limit(run.max_iters))
+    return {"recursion_limit": limit, "configurable": configurable}
+
+
+def resolve(config: dict, state: dict = None) -> RunConfig:
+    '''
+    The run's RunConfig from LangGraph's config. Callers that invoke the graph without one
+    (plain graph.invoke(state)) get it resolved from env + state["settings"] instead.
+    '''
+    run = ((config or {}).get("configurable") or {}).get("run_config")
+    if run is None:
+        run = RunConfig.from_env((state or {}).get("settings"))
+    return run
@@ -0,0 +1,92 @@
+import hashlib
+import re
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from; they never change the page.
+_TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "ref_url", "_ga", "_gl", "spm", "cmpid", "si",
+})
+_TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+SIMHASH_BITS = 64
+SHINGLE_WORDS = 3
+# Fingerprints of very short texts (error pages, stubs) collide too easily to mean anything.
+MIN_WORDS = 50
+
+
+def canonical_url(url: str) -> str:
+    '''
+    A comparison key for URLs that point at the same page: http/https and "www." variants,
+    default ports, fragments, tracking parameters, parameter order and trailing slashes are ignored.
+    Non-web URLs (file://, ...) are returned unchanged.
+    '''
+    try:
+        parts = urlsplit((url or "").strip())
+    except ValueError:
+        return url or ""
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return url or ""
+    host = parts.hostname.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != _DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith(_TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip("/")
+    # The scheme is dropped from the key: the same page served over http and https is one source.
+    return urlunsplit(("", host, path, urlencode(query), ""))
+
+
+def simhash(text: str):
+    '''
+    64-bit SimHash over word 3-gram shingles (Charikar): near-identical texts, such as mirrors or
+    syndicated copies with a different header/footer, differ in only a few bits.
+    Returns None for texts too short to fingerprint reliably.
+    '''
+    words = _WORD.findall((text or "").lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = Counter(" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+    hashes = [
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"), n)
+        for s, n in shingles.items()
+    ]
+    total = sum(n for _, n in hashes)
+    fingerprint = 0
+    for bit in range(SIMHASH_BITS):
+        mask = 1 << bit
+        # Bit is set when the shingles having it outweigh the ones that don't.
+        if 2 * sum(n for h, n in hashes if h & mask) > total:
+            fingerprint |= mask
+    return fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def near_duplicate_of(fingerprint, seen: list, max_distance: int):
+    '''Id of the first entry in `seen` [(id, fingerprint)] within `max_distance` bits, else None.'''
+    if fingerprint is None:
+        return None
+    for source_id, other in seen:
+        if hamming(fingerprint, other) <= max_distance:
+            return source_id
+    return None
+
+
+def distinct_sources(sources: list) -> list:
+    '''Sources that are not near-duplicates of an earlier one (what prompts and reference lists show).'''
+    return [s for s in sources if not s.get("duplicate_of")]
@@ -0,0 +1,139 @@
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - stdlib fallback
+    etree = None
+
+# Boilerplate and non-content elements whose text is dropped entirely.
+SKIP_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg", "iframe", "canvas",
+    "nav", "header", "footer", "aside", "form", "button", "select", "head",
+})
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+TEXT_TYPES = HTML_TYPES + ("text/plain",)
+
+
+class UnsupportedContent(Exception):
+    '''Raised for responses that are not HTML/plain text (PDFs, images, binaries, ...).'''
+
+
+class _Collector:
+    '''
+    Parser target: receives start/end/data events and keeps the visible text, one stripped
+    text node per line (like BeautifulSoup's get_text("\\n", strip=True)), until max_chars.
+    '''
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.lines = []
+        self.chars = 0
+        self.skip_depth = 0
+        self._buf = []  # parsers may split one text node into several data events (e.g. at entities)
+
+    @property
+    def done(self) -> bool:
+        return self.chars >= self.max_chars
+
+    def flush(self):
+        if self._buf:
+            text = "".join(self._buf).strip()
+            self._buf = []
+            if text:
+                self.lines.append(text)
+                self.chars += len(text) + 1
+
+    def start(self, tag, attrib=None):
+        self.flush()
+        if str(tag).lower() in SKIP_TAGS:
+            self.skip_depth += 1
+
+    def end(self, tag):
+        self.flush()
+        if str(tag).lower() in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, text):
+        if not self.skip_depth and not self.done:
+            self._buf.append(text)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        self.flush()
+        return "\n".join(self.lines)
+
+
+class _StdlibDriver(HTMLParser):
+    # html.parser fallback that forwards events to the same collector.
+
+    def __init__(self, collector: _Collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+class StreamingExtractor:
+    '''
+    Incremental HTML -> text. Feed decoded chunks as they arrive and stop reading once `done`.
+    Uses lxml's event-target parser (no tree is built) and falls back to html.parser.
+    '''
+
+    def __init__(self, max_chars: int, content_type: str = "text/html"):
+        self.collector = _Collector(max_chars)
+        self.plain = not content_type.startswith(HTML_TYPES)
+        self._partial = ""
+        if self.plain:
+            self._parser = None
+        elif etree is not None:
+            self._parser = etree.HTMLParser(target=self.collector, remove_comments=True, no_network=True)
+        else:
+            self._parser = _StdlibDriver(self.collector)
+
+    @property
+    def done(self) -> bool:
+        return self.collector.done
+
+    def feed(self, chunk: str):
+        if self.plain:
+            # Keep the trailing partial line until the next chunk completes it.
+            lines = (self._partial + chunk).split("\n")
+            self._partial = lines.pop()
+            for line in lines:
+                self.collector.data(line)
+                self.collector.flush()
+        else:
+            self._parser.feed(chunk)
+
+    def close(self) -> str:
+        if self.plain:
+            self.collector.data(self._partial)
+        if self._parser is not None:
+            try:
+                self._parser.close()
+            except Exception:
+                pass  # truncated documents are expected when we stop early
+        return self.collector.close()
+
+
+def check_content_type(content_type: str) -> str:
+    '''Returns the bare media type, or raises UnsupportedContent before any body is read.'''
+    media = (content_type or "text/html").split(";")[0].strip().lower()
+    if media not in TEXT_TYPES:
+        raise UnsupportedContent(f"Skipping non-text content type: {media}")
+    return media
+
+
+def extract_text(html: str, max_chars: int) -> str:
+    ex = StreamingExtractor(max_chars)
+    ex.feed(html)
+    return ex.close()[:max_chars]
@@ -0,0 +1,274 @@
+import asyncio
+import contextvars
+import importlib.util
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import httpx
+from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_not_exception_type
+
+from .utils import env_int, env_float
+from .cache import page_cache
+from .tracing import span, annotate, count_retry
+from .extract import StreamingExtractor, UnsupportedContent, check_content_type
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+_HOST_SLOTS = {}
+# Async clients and per-host semaphores are bound to an event loop, so keep one set per loop.
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+_ASYNC_HOST_SLOTS = weakref.WeakKeyDictionary()
+
+
+class _Limits(NamedTuple):
+    max_bytes: int
+    max_per_host: int
+    workers: int
+    deadline_secs: float
+
+
+_LIMITS = None
+
+
+def _limits() -> _Limits:
+    # Process-wide fetch limits, read from env once (like the pooled clients).
+    global _LIMITS
+    if _LIMITS is None:
+        _LIMITS = _Limits(
+            max_bytes=env_int("FETCH_MAX_BYTES", 2 * 1024 * 1024),
+            max_per_host=max(1, env_int("FETCH_MAX_PER_HOST", 2)),
+            workers=env_int("FETCH_WORKERS", 4),
+            deadline_secs=env_float("FETCH_DEADLINE_SECS", 30.0),
+        )
+    return _LIMITS
+
+
+def _http2_enabled() -> bool:
+    # HTTP/2 needs the optional `h2` package (pip install "httpx[http2]").
+    if os.getenv("HTTP_HTTP2", "1") != "1":
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+def _client_kwargs() -> dict:
+    max_conns = env_int("HTTP_MAX_CONNECTIONS", 20)
+    return dict(
+        timeout=env_int("HTTP_TIMEOUT_SECS", 15),
+        follow_redirects=True,
+        http2=_http2_enabled(),
+        headers={"User-Agent": "Mozilla/5.0"},
+        limits=httpx.Limits(
+            max_connections=max_conns,
+            max_keepalive_connections=max_conns,
+            keepalive_expiry=env_float("HTTP_KEEPALIVE_SECS", 30.0),
+        ),
+    )
+
+
+def http_client() -> httpx.Client:
+    '''
+    One long-lived pooled client shared by every fetch (keep-alive + HTTP/2 when available).
+    httpx.Client is thread-safe, so the fetch workers all reuse its connection pool.
+    '''
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = httpx.Client(**_client_kwargs())
+    return _CLIENT
+
+
+def async_http_client() -> httpx.AsyncClient:
+    '''Pooled async client for the running event loop (one per loop).'''
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(**_client_kwargs())
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc.lower()
+    with _CLIENT_LOCK:
+        slot = _HOST_SLOTS.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(_limits().max_per_host)
+            _HOST_SLOTS[host] = slot
+    return slot
+
+
+def _async_host_slot(url: str) -> asyncio.Semaphore:
+    slots = _ASYNC_HOST_SLOTS.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(url).netloc.lower()
+    if host not in slots:
+        slots[host] = asyncio.Semaphore(_limits().max_per_host)
+    return slots[host]
+
+
+def _cache_lookup(url: str):
+    '''Returns (cache, cached_page, conditional_headers).'''
+    cache = page_cache()
+    cached = cache.get(url) if cache else None
+    headers = {}
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+    return cache, cached, headers
+
+
+_RETRY = dict(
+    stop=stop_after_attempt(2),
+    wait=wait_fixed(1),
+    retry=retry_if_not_exception_type(UnsupportedContent),
+    before_sleep=count_retry,
+)
+
+
+@retry(**_RETRY)
+def _fetch_page(url: str, timeout: int, max_chars: int) -> tuple[str, str]:
+    cache, cached, headers = _cache_lookup(url)
+    if cached and cached.fresh:
+        return cached.text[:max_chars], "hit"
+
+    # Stream the body: skip non-text types before reading it, stop once enough text is
+    # collected or FETCH_MAX_BYTES have been downloaded.
+    with _host_slot(url), http_client().stream("GET", url, headers=headers, timeout=timeout) as r:
+        if r.status_code == 304 and cached:
+            cache.refresh(url)
+            return cached.text[:max_chars], "revalidated"
+        r.raise_for_status()
+        extractor = StreamingExtractor(max_chars, check_content_type(r.headers.get("Content-Type")))
+        max_bytes = _limits().max_bytes
+        for chunk in r.iter_text():
+            extractor.feed(chunk)
+            if extractor.done or r.num_bytes_downloaded >= max_bytes:
+                break
+        annotate(status=r.status_code, bytes=r.num_bytes_downloaded)
+    text = extractor.close()
+
+    if cache:
+        cache.put(url, text, etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"))
+    return text[:max_chars], "miss"
+
+
+@retry(**_RETRY)
+async def _afetch_page(url: str, timeout: int, max_chars: int) -> tuple[str, str]:
+    # The page cache is SQLite (blocking), so its reads and writes run off the event loop.
+    cache, cached, headers = await asyncio.to_thread(_cache_lookup, url)
+    if cached and cached.fresh:
+        return cached.text[:max_chars], "hit"
+
+    async with _async_host_slot(url), async_http_client().stream("GET", url, headers=headers, timeout=timeout) as r:
+        if r.status_code == 304 and cached:
+            await asyncio.to_thread(cache.refresh, url)
+            return cached.text[:max_chars], "revalidated"
+        r.raise_for_status()
+        extractor = StreamingExtractor(max_chars, check_content_type(r.headers.get("Content-Type")))
+        max_bytes = _limits().max_bytes
+        async for chunk in r.aiter_text():
+            extractor.feed(chunk)
+            if extractor.done or r.num_bytes_downloaded >= max_bytes:
+                break
+        annotate(status=r.status_code, bytes=r.num_bytes_downloaded)
+    text = extractor.close()
+
+    if cache:
+        await asyncio.to_thread(cache.put, url, text, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+    return text[:max_chars], "miss"
+
+
+def fetch_page(url: str, timeout: int, max_chars: int) -> tuple[str, str]:
+    '''
+    Returns (text, cache_status) where cache_status is "hit", "revalidated" or "miss".
+    Stale cache entries are revalidated with a conditional GET (ETag / Last-Modified).
+    '''
+    with span("fetch", "fetch", url=url) as attrs:
+        text, attrs["cache"] = _fetch_page(url, timeout=timeout, max_chars=max_chars)
+        return text, attrs["cache"]
+
+
+async def afetch_page(url: str, timeout: int, max_chars: int) -> tuple[str, str]:
+    '''Async twin of fetch_page on the loop's pooled AsyncClient.'''
+    with span("fetch", "fetch", url=url) as attrs:
+        text, attrs["cache"] = await _afetch_page(url, timeout=timeout, max_chars=max_chars)
+        return text, attrs["cache"]
+
+
+def fetch_pages(urls: list[str], timeout: int, max_chars: int, deadline_secs: float = None) -> dict:
+    '''
+    Fetch several pages concurrently.
+    Returns {url: (text, cache_status)} for successes and {url: Exception} for failures; URLs still
+    in flight when the wall-clock deadline passes are reported as TimeoutError.
+    '''
+    if not urls:
+        return {}
+    if deadline_secs is None:
+        deadline_secs = _limits().deadline_secs
+    workers = max(1, min(_limits().workers, len(urls)))
+    deadline = time.monotonic() + deadline_secs
+
+    def job(url):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Fetch deadline exceeded.")
+        return fetch_page(url, timeout=min(timeout, remaining), max_chars=max_chars)
+
+    results = {}
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+    try:
+        # copy_context() carries the active tracer into the worker threads.
+        futures = {pool.submit(contextvars.copy_context().run, job, url): url for url in urls}
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    results[futures[fut]] = fut.result()
+                except Exception as e:
+                    results[futures[fut]] = e
+        for fut in pending:
+            fut.cancel()
+            results[futures[fut]] = TimeoutError("Fetch deadline exceeded.")
+    finally:
+        # Don't block on stragglers; their own request timeout bounds them.
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+async def afetch_pages(urls: list[str], timeout: int, max_chars: int, deadline_secs: float = None) -> dict:
+    '''Async twin of fetch_pages: same result shape, same deadline semantics.'''
+    if not urls:
+        return {}
+    if deadline_secs is None:
+        deadline_secs = _limits().deadline_secs
+    deadline = time.monotonic() + deadline_secs
+
+    async def job(url):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Fetch deadline exceeded.")
+        return await afetch_page(url, timeout=min(timeout, remaining), max_chars=max_chars)
+
+    tasks = {asyncio.ensure_future(job(url)): url for url in urls}
+    done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+    results = {}
+    for task in done:
+        try:
+            results[tasks[task]] = task.result()
+        except Exception as e:
+            results[tasks[task]] = e
+    for task in pending:
+        task.cancel()
+        results[tasks[task]] = TimeoutError("Fetch deadline exceeded.")
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return results
@@ -1,33 +1,86 @@
+import copy
+
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from .state import AgentState
+from .tracing import span
+from .config import resolve
 from .nodes import (
     planner_node,
     research_node,
     draft_node,
     critique_node,
+    gate_node,
+    review_node,
     revise_node,
+    prefetch_node,
     decide_node,
+    aplanner_node,
+    aresearch_node,
+    adraft_node,
+    acritique_node,
+    agate_node,
+    areview_node,
+    arevise_node,
+    aprefetch_node,
+    adecide_node,
 )
 
-def build_graph():
+def _node(name, func, afunc, parallel=False):
+    # invoke()/stream() run the sync function, ainvoke()/astream() the async one.
+    # Both are wrapped in a trace span so every node transition is timed, and both get
+    # the run's RunConfig from LangGraph's config.
+    # Nodes in a parallel branch get a private copy of the state: they update nested values
+    # (budget counters, sources) in place and must not see each other's changes. They return
+    # only the keys they own.
+    def run(state, config):
+        if parallel:
+            state = copy.deepcopy(state)
+        with span(name, "node", iteration=state.get("iteration", 0)):
+            return func(state, resolve(config, state))
+
+    async def arun(state, config):
+        if parallel:
+            state = copy.deepcopy(state)
+        with span(name, "node", iteration=state.get("iteration", 0)):
+            return await afunc(state, resolve(config, state))
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+def build_graph(checkpointer=None):
+    '''
+    Compile the Reflexion graph. With a checkpointer (see checkpoint.checkpointer()) the state
+    is saved after every node, so a run can be resumed with graph.invoke(None, config)
+    using the same thread id.
+
+    planner → research → draft → {critique ∥ gate} → review → {revise ∥ prefetch} → decide
+    The rule-based gate runs alongside the LLM critique, and while revise generates, prefetch
+    starts the next iteration's searches/fetches if decide is expected to continue.
+    '''
     g = StateGraph(AgentState)
 
-    g.add_node("planner", planner_node)
-    g.add_node("research", research_node)
-    g.add_node("draft", draft_node)
-    g.add_node("critique", critique_node)
-    g.add_node("revise", revise_node)
-    g.add_node("decide", decide_node)
+    g.add_node("planner", _node("planner", planner_node, aplanner_node))
+    g.add_node("research", _node("research", research_node, aresearch_node))
+    g.add_node("draft", _node("draft", draft_node, adraft_node))
+    g.add_node("critique", _node("critique", critique_node, acritique_node, parallel=True))
+    g.add_node("gate", _node("gate", gate_node, agate_node, parallel=True))
+    g.add_node("review", _node("review", review_node, areview_node))
+    g.add_node("revise", _node("revise", revise_node, arevise_node, parallel=True))
+    g.add_node("prefetch", _node("prefetch", prefetch_node, aprefetch_node, parallel=True))
+    g.add_node("decide", _node("decide", decide_node, adecide_node))
 
     g.add_edge(START, "planner")
     g.add_edge("planner", "research")
     g.add_edge("research", "draft")
     g.add_edge("draft", "critique")
-    g.add_edge("critique", "revise")
-    g.add_edge("revise", "decide")
+    g.add_edge("draft", "gate")
+    g.add_edge(["critique", "gate"], "review")
+    g.add_edge("review", "revise")
+    g.add_edge("review", "prefetch")
+    g.add_edge(["revise", "prefetch"], "decide")
 
     def route(state: AgentState):
         return END if state["decision"] == "stop" else "research"
 
     g.add_conditional_edges("decide", route, {END: END, "research": "research"})
-    return g.compile()
+    return g.compile(checkpointer=checkpointer)
@@ -1,19 +1,43 @@
-import os
-from .utils import env_int, rough_token_estimation, has_citation_markers, find_numeric_claim_lines_without_cites
+import re
+import time
+
+from .config import RunConfig
+from .tokens import token_counter, fit_parts
+from .tracing import annotate
+from .citations import analyze
+from .dedupe import distinct_sources
 
 class BudgetGuard:
 
-    def __init__(self):
-        self.max_search_calls = env_int("BUDGET_MAX_SEARCH_CALLS", 6)
-        self.max_pages_fetched = env_int("BUDGET_MAX_PAGES_FETCHED", 6)
-        self.max_token_estimate = env_int("BUDGET_MAX_TOKEN_ESTIMATE", 12000)
+    def __init__(self, cfg: RunConfig):
+        self.max_search_calls = cfg.max_search_calls
+        self.max_pages_fetched = cfg.max_pages_fetched
+        self.max_token_estimate = cfg.max_token_estimate
+        self.num_ctx = cfg.num_ctx
+        self.reserve_output_tokens = cfg.reserve_output_tokens
+        self.counter = token_counter(cfg.model, cfg.tokenizer_path)
 
     def add_tokens(self, state, text: str, reason: str):
-        inc = rough_token_estimation(text)
+        inc = self.counter.count(text)
         state["budget"]["token_estimate"] += inc
         if state["budget"]["token_estimate"] > self.max_token_estimate:
             self.stop(state, f"Token estimate exceeded after {reason} (+{inc}).")
 
+    def fit_prompt(self, state, parts: list, reason: str) -> str:
+        '''
+        Preflight: build the prompt from [(text, trimmable)] parts so that it, plus room for the
+        answer (PROMPT_RESERVE_OUTPUT_TOKENS), fits both the model context (OLLAMA_NUM_CTX) and
+        the remaining token budget. Trimmable parts are shortened before the call instead of the
+        model truncating the prompt or the budget tripping afterwards.
+        '''
+        remaining = self.max_token_estimate - state["budget"]["token_estimate"]
+        limit = min(self.num_ctx, remaining) - self.reserve_output_tokens
+        prompt, trimmed = fit_parts(self.counter, parts, max(0, limit))
+        if trimmed:
+            state["budget"]["trimmed_tokens"] = state["budget"].get("trimmed_tokens", 0) + trimmed
+            annotate(trimmed_tokens=trimmed, trimmed_from=reason)
+        return prompt
+
     def inc_search(self, state):
         state["budget"]["search_calls"] += 1
         if state["budget"]["search_calls"] > self.max_search_calls:
@@ -24,9 +48,17 @@ class BudgetGuard:
         if state["budget"]["pages_fetched"] > self.max_pages_fetched:
             self.stop(state, "Page fetch limit exceeded.")
 
+    def can_search_more(self, state) -> bool:
+        return state["budget"]["search_calls"] < self.max_search_calls
+
     def can_fetch_more(self, state) -> bool:
         return state["budget"]["pages_fetched"] < self.max_pages_fetched
 
+    def count_cache(self, state, cache: str, outcome: str):
+        # Cache hits/misses are reported alongside the budget counters; they don't consume budget.
+        stats = state["budget"].setdefault("cache", {}).setdefault(cache, {})
+        stats[outcome] = stats.get(outcome, 0) + 1
+
     def stop(self, state, why: str):
         state["budget"]["stopped"] = True
         state["budget"]["reasons"].append(why)
@@ -36,8 +68,8 @@ class BudgetGuard:
     
 class QualityGate:
 
-    def __init__(self):
-        self.require_citations = os.getenv("REQUIRE_CITATIONS_WHEN_RESEARCH_ENABLED", "1") == "1"
+    def __init__(self, cfg: RunConfig):
+        self.require_citations = cfg.require_citations
         
     def check(self, state, text: str) -> tuple[int, str]:
         '''
@@ -49,12 +81,96 @@ class QualityGate:
             
             return (5, "Research is disabled / blocked. Add uncertainity and clear verification guidance using the term- verify")
         
-        if not has_citation_markers(text):
+        # Near-duplicate sources are left out of References, so citing one counts as dangling.
+        report = analyze(text, (s["id"] for s in distinct_sources(state.get("sources", []))))
+        if not report.has_citations:
             return (3, "Missing citation marks. Add inline markers like [S#] representing a source while claiming a fact.")
+
+        if report.dangling_ids:
+            return (5, f"Citations to sources that do not exist: {', '.join(report.dangling_ids)}. Cite only the listed [S#] sources.")
+
+        if report.uncited_numeric:
+            sample= "\n".join(f"- {c.text}" for c in report.uncited_numeric[:6])
+            return (6, f"Some numeric/dated claims lack citations. Add [S#] to the same sentence:\n{sample}")
         
-        bad_lines = find_numeric_claim_lines_without_cites(text)
-        if bad_lines:
-            sample= "\n".join(f"- {l}" for l in bad_lines[:6])
-            return (6, f"Some numeric/dated claims lack citations. Add [S#] on the same line:\n{sample}")
-        
-        return (9, "No major issues: citations present and numeric claims appear supported.")
\ No newline at end of file
+        return (9, "No major issues: citations present and numeric claims appear supported.")
+
+
+# "quality_score: 7", "1) Quality score (0-10) = 7.5/10", "**quality_score**: 6", ...
+# The number after "quality score", skipping punctuation/markup and any parenthetical such as a
+# scale echo "(0–10)"; not a list number ("2) ...") from the next line. "N/D" and "N out of D" are rescaled.
+_LLM_SCORE = re.compile(
+    r"quality[ _]score(?:[^\w(]|\([^)\n]{0,20}\)){0,8}?(\d+(?:\.\d+)?)(?![\d.])(?!\s*\))"
+    r"(?:\s*(?:/|out\s+of)\s*(\d+))?",
+    re.IGNORECASE,
+)
+
+def parse_llm_score(critique: str):
+    '''
+    The score from the critique's own quality_score line on a 0-10 scale, or None when it gave none.
+
+    >>> [parse_llm_score(t) for t in ("quality_score: 7", "**Quality score**: 6.5", "quality_score (0–10): 7")]
+    [7.0, 6.5, 7.0]
+    >>> [parse_llm_score(t) for t in ("quality_score (1-10): 8", "quality_score (0-10)\\n8", "Quality score = 4/5")]
+    [8.0, 8.0, 8.0]
+    >>> [parse_llm_score(t) for t in ("quality_score\\n2) short critique", "quality_score: 11", "no score")]
+    [None, None, None]
+    '''
+    m = _LLM_SCORE.search(critique or "")
+    if not m:
+        return None
+    score = float(m.group(1))
+    if m.group(2) and int(m.group(2)) > 0:
+        score = score * 10 / int(m.group(2))
+    return round(score, 2) if score <= 10 else None
+
+class StopController:
+    '''
+    Decides when the Reflexion loop stops. Besides the hard limits (budget stop,
+    EARLY_STOP_MIN_SCORE, MAX_ITERS) it compares the last two entries of state["score_history"]:
+    the latest score gain is taken as the expected gain of one more iteration, and the run stops
+    when it is below STOP_MIN_GAIN (plateau) or worth less than what the last iteration cost
+    (STOP_SECS_PER_POINT seconds / STOP_TOKENS_PER_POINT tokens per quality point).
+    '''
+
+    def __init__(self, cfg: RunConfig):
+        self.max_iters = cfg.max_iters
+        self.early_stop_min_score = cfg.early_stop_min_score
+        self.min_gain = cfg.stop_min_gain
+        self.secs_per_point = cfg.stop_secs_per_point
+        self.tokens_per_point = cfg.stop_tokens_per_point
+
+    def record(self, state, gate_score: int, llm_score) -> float:
+        # The quality score must pass both the rule-based gate and the LLM's own judgement.
+        score = gate_score if llm_score is None else min(gate_score, llm_score)
+        state["score_history"].append({
+            "iteration": state["iteration"],
+            "score": score,
+            "gate_score": gate_score,
+            "llm_score": llm_score,
+            "tokens": state["budget"]["token_estimate"],  # cumulative; deltas are per-iteration costs
+            "at": round(time.time(), 3),
+        })
+        return score
+
+    def stop_reason(self, state, iteration: int) -> str:
+        '''Why the run should stop after `iteration` completed iterations, or "" to continue.'''
+        if state["budget"]["stopped"]:
+            return "budget"
+        if state["quality_score"] >= self.early_stop_min_score:
+            return "score"
+        if iteration >= self.max_iters:
+            return "max_iters"
+
+        history = state.get("score_history") or []
+        if len(history) < 2:
+            return ""
+        prev, last = history[-2], history[-1]
+        gain = last["score"] - prev["score"]
+        if gain < self.min_gain:
+            return "plateau"
+        if self.secs_per_point and gain * self.secs_per_point < last["at"] - prev["at"]:
+            return "cost"
+        if self.tokens_per_point and gain * self.tokens_per_point < last["tokens"] - prev["tokens"]:
+            return "cost"
+        return ""
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+from .extract import extract_text
+from .retrieval import tokenize
+
+_INDEX = None
+_INDEX_PATH = None  # SEARCH_INDEX_PATH, read on first use
+_INDEX_LOCK = threading.Lock()
+
+# File types indexed from a document directory.
+TEXT_SUFFIXES = (".txt", ".md", ".rst")
+HTML_SUFFIXES = (".html", ".htm")
+
+
+class LocalIndex:
+    '''
+    Offline full-text search over local documents (SQLite FTS5, BM25 ranking).
+    `docs` keeps each document's full text, so hits come back with their content and the
+    research node can skip fetching them.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL, title TEXT NOT NULL, "
+                "body TEXT NOT NULL, indexed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5("
+                "title, body, content='docs', content_rowid='id', tokenize='porter unicode61')"
+            )
+            # External-content FTS table kept in sync with `docs` by triggers.
+            self._db.executescript(
+                """
+                CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+                    INSERT INTO docs_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+                END;
+                CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+                    INSERT INTO docs_fts(docs_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+                END;
+                CREATE TRIGGER IF NOT EXISTS docs_au AFTER UPDATE ON docs BEGIN
+                    INSERT INTO docs_fts(docs_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+                    INSERT INTO docs_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+                END;
+                """
+            )
+
+    def add_many(self, docs: Iterable[tuple[str, str, str]]) -> int:
+        '''Adds or replaces (url, title, text) documents. Returns how many were written.'''
+        now = time.time()
+        rows = [(url, title or url, text, now) for url, title, text in docs if text and text.strip()]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO docs (url, title, body, indexed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET title = excluded.title, body = excluded.body, "
+                "indexed_at = excluded.indexed_at",
+                rows,
+            )
+        return len(rows)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        '''
+        BM25-ranked hits (title matches weigh more) in the search-result shape used by the
+        research node: {"title", "href", "body" (snippet), "content" (full text)}.
+        '''
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT d.url, d.title, snippet(docs_fts, 1, '', '', ' … ', 32), d.body "
+                "FROM docs_fts JOIN docs d ON d.id = docs_fts.rowid "
+                "WHERE docs_fts MATCH ? ORDER BY bm25(docs_fts, 5.0, 1.0) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [{"title": title, "href": url, "body": snippet, "content": body} for url, title, snippet, body in rows]
+
+
+def _title_from_text(text: str, fallback: str) -> str:
+    for line in text.splitlines():
+        line = line.strip().lstrip("#").strip()
+        if line:
+            return line[:120]
+    return fallback
+
+
+def iter_directory(root: str, max_chars: int) -> Iterable[tuple[str, str, str]]:
+    '''Yields (url, title, text) for the text/markdown/HTML files under `root`.'''
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            suffix = os.path.splitext(name)[1].lower()
+            if suffix not in TEXT_SUFFIXES + HTML_SUFFIXES:
+                continue
+            with open(path, encoding="utf-8", errors="replace") as f:
+                raw = f.read()
+            text = extract_text(raw, max_chars) if suffix in HTML_SUFFIXES else raw[:max_chars]
+            yield "file://" + os.path.abspath(path), _title_from_text(text, name), text
+
+
+def iter_page_cache(cache) -> Iterable[tuple[str, str, str]]:
+    '''Yields (url, title, text) for every page in a PageCache.'''
+    for url, text in cache.iter_pages():
+        yield url, _title_from_text(text, url), text
+
+
+def local_index() -> Optional[LocalIndex]:
+    '''Process-wide local search index at SEARCH_INDEX_PATH (None if it has not been built).'''
+    global _INDEX, _INDEX_PATH
+    if _INDEX is not None:
+        return _INDEX
+    if _INDEX_PATH is None:
+        _INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", ".cache/index.sqlite")
+    # Checked on every call until it exists, so an index built while the process runs is picked up.
+    if not os.path.exists(_INDEX_PATH):
+        return None
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = LocalIndex(_INDEX_PATH)
+    return _INDEX
+
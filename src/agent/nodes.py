@@ -1,89 +1,232 @@
-import os
+import asyncio
 import re
+import threading
+from collections import OrderedDict
 from typing import List
-import httpx
-from bs4 import BeautifulSoup
-from tenacity import retry, stop_after_attempt, wait_fixed
-from ddgs import DDGS
+
+from langgraph.constants import TAG_NOSTREAM
 
 from .state import AgentState, Source
-from .prompts import PLANNER_PROMPT, RESEARCH_PROMPT, DRAFT_PROMPT, CRITIQUE_PROMPT, REVISE_PROMPT, QUERY_WRITER_PROMPT
-from .guards import BudgetGuard, QualityGate
-from .utils import env_int, env_float
-
-_LLM = None
-
-def _llm():
-    global _LLM
-    if _LLM is None:
-        from langchain_ollama import ChatOllama
-        _LLM = ChatOllama(
-            model=os.getenv("OLLAMA_MODEL", "llama3.1:8b-instruct-q4_K_M"),
-            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-            temperature=env_float("OLLAMA_TEMPERATURE", 0.2),
-        )
-    return _LLM
-
-
-@retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
-def fetch_page_text(url: str, timeout: int, max_chars: int) -> str:
-    with httpx.Client(timeout=timeout, follow_redirects=True) as client:
-        r = client.get(url, headers={"User-Agent": "Mozilla/5.0"})
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        text = soup.get_text("\n", strip=True)
-        return text[:max_chars]
-
-def planner_node(state: AgentState) -> AgentState:
-    llm = _llm()
-    bg = BudgetGuard()
-    q = state["question"]
-
-    prompt = f"{PLANNER_PROMPT}\n\nUser question:\n{q}\n"
+from .prompts import PLANNER_PROMPT, RESEARCH_PROMPT, RESEARCH_UPDATE_PROMPT, DRAFT_PROMPT, CRITIQUE_PROMPT, REVISE_PROMPT, REVISE_SECTION_PROMPT, QUERY_WRITER_PROMPT
+from .guards import BudgetGuard, QualityGate, StopController, parse_llm_score
+from .config import LLM_NODES, RunConfig
+from .fetch import fetch_pages, afetch_pages
+from .search import cached_search, normalize_query, search_many, asearch_many
+from .cache import llm_cache, ResponseCache, content_store
+from .tracing import span, llm_usage, annotate
+from .retrieval import select_chunks
+from .tokens import token_counter, fit_parts
+from .dedupe import canonical_url, simhash, near_duplicate_of, distinct_sources
+from .citations import analyze
+from .sections import Section, split_sections, join_sections, section_at
+from .utils import env_int
+
+# (model, base_url, temperature, num_ctx, keep_alive) -> client, one per routed model. Per-run
+# settings can ask for more, so the least recently used clients beyond LLM_CLIENTS_MAX are dropped.
+_LLMS = OrderedDict()
+_LLMS_MAX = None  # LLM_CLIENTS_MAX, read on first use
+_LLM_LOCK = threading.Lock()
+
+def _make_llm(cfg: RunConfig, model: str):
+    from langchain_ollama import ChatOllama
+    return ChatOllama(
+        model=model, base_url=cfg.base_url, temperature=cfg.temperature, num_ctx=cfg.num_ctx, keep_alive=cfg.keep_alive
+    )
+
+def _llm(cfg: RunConfig, node: str = "draft"):
+    # The client for the model MODEL_ROUTES assigns to `node`.
+    model = cfg.model_for(node)
+    key = (model, cfg.base_url, cfg.temperature, cfg.num_ctx, cfg.keep_alive)
+    global _LLMS_MAX
+    with _LLM_LOCK:
+        llm = _LLMS.get(key)
+        if llm is not None:
+            _LLMS.move_to_end(key)
+            return llm
+        if _LLMS_MAX is None:
+            _LLMS_MAX = max(1, env_int("LLM_CLIENTS_MAX", 8))
+        llm = _LLMS[key] = _make_llm(cfg, model)
+        while len(_LLMS) > _LLMS_MAX:
+            _LLMS.popitem(last=False)
+    return llm
+
+def warm_clients(cfg: RunConfig):
+    '''Builds the shared client of every routed model up front, so the first run doesn't pay for it.'''
+    for node in LLM_NODES:
+        _llm(cfg, node)
+
+
+def _cache_lookup(state: AgentState, cfg: RunConfig, node: str, prompt: str):
+    '''
+    Returns (cache, key, cached_text). Responses are only cached for (near-)deterministic
+    temperatures (<= LLM_CACHE_MAX_TEMPERATURE); per-node hits/misses go to budget["cache"].
+    '''
+    llm = _llm(cfg, node)
+    cache = llm_cache()
+    if cache is None or llm.temperature > cfg.llm_cache_max_temperature:
+        return None, None, None
+
+    key = ResponseCache.key(llm.model, llm.temperature, prompt)
+    text = cache.get(key)
+    BudgetGuard(cfg).count_cache(state, f"llm:{node}", "miss" if text is None else "hit")
+    return cache, key, text
+
+
+def _record(cfg: RunConfig, attrs: dict, prompt: str, message) -> str:
+    # Trace the real token counts and use them to calibrate the answering model's token counter.
+    usage = llm_usage(message)
+    attrs.update(usage, completion_chars=len(message.content))
+    if "prompt_tokens" in usage:
+        token_counter(attrs["model"], cfg.tokenizer_path).observe(prompt, usage["prompt_tokens"])
+    return message.content
+
+
+def _llm_config(stream: bool):
+    # Untagged calls stream their tokens (stream_mode "messages"); the rest show up once the node ends.
+    return None if stream else {"tags": [TAG_NOSTREAM]}
+
+
+def _invoke(state: AgentState, cfg: RunConfig, node: str, prompt: str, stream: bool = True) -> str:
+    with span(node, "llm", model=cfg.model_for(node), prompt_chars=len(prompt)) as attrs:
+        cache, key, text = _cache_lookup(state, cfg, node, prompt)
+        attrs["cached"] = text is not None
+        if text is not None:
+            return text
+        text = _record(cfg, attrs, prompt, _llm(cfg, node).invoke(prompt, config=_llm_config(stream)))
+        if cache is not None:
+            cache.put(key, text)
+        return text
+
+
+async def _ainvoke(state: AgentState, cfg: RunConfig, node: str, prompt: str, stream: bool = True) -> str:
+    with span(node, "llm", model=cfg.model_for(node), prompt_chars=len(prompt)) as attrs:
+        # The cache's SQLite tier is blocking, so it is read and written off the event loop.
+        cache, key, text = await asyncio.to_thread(_cache_lookup, state, cfg, node, prompt)
+        attrs["cached"] = text is not None
+        if text is not None:
+            return text
+        text = _record(cfg, attrs, prompt, await _llm(cfg, node).ainvoke(prompt, config=_llm_config(stream)))
+        if cache is not None:
+            await asyncio.to_thread(cache.put, key, text)
+        return text
+
+
+_HOW_TO_VERIFY = re.compile(r"(?i)(\n|^)\s*(#{1,6}|[*_]{2})\s*How to verify.*?((?=\n\s*#{1,6})|\Z)", flags=re.DOTALL)
+
+def _strip_how_to_verify(state: AgentState, text: str) -> str:
+    # Force cleaning of "How to Verify" if research is enabled
+    if state["research_enabled"]:
+        return _HOW_TO_VERIFY.sub("", text).strip()
+    return text
+
+
+# Each node is split into a prompt-building step and an apply step around the LLM call,
+# so the sync (invoke) and async (ainvoke) variants share all of their logic.
+
+def _planner_prompt(state: AgentState, bg: BudgetGuard):
+    prompt = f"{PLANNER_PROMPT}\n\nUser question:\n{state['question']}\n"
     bg.add_tokens(state, prompt, "planner prompt")
     if bg.is_stopped(state):
         state["plan"] = "Budget stopped before planning; proceed cautiously with verification steps."
-        return state
+        return None
+    return prompt
 
-    state["plan"] = llm.invoke(prompt).content
+def _planner_apply(state: AgentState, bg: BudgetGuard, plan: str) -> AgentState:
+    state["plan"] = plan
     bg.add_tokens(state, state["plan"], "planner output")
     return state
 
-def research_node(state: AgentState) -> AgentState:
-    bg = BudgetGuard()
-    if not state["research_enabled"] or bg.is_stopped(state):
+def planner_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    bg = BudgetGuard(cfg)
+    prompt = _planner_prompt(state, bg)
+    if prompt is None:
         return state
+    return _planner_apply(state, bg, _invoke(state, cfg, "planner", prompt))
 
-    # 1) Search (dynamic query)
-    bg.inc_search(state)
-    if bg.is_stopped(state):
+async def aplanner_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    bg = BudgetGuard(cfg)
+    prompt = _planner_prompt(state, bg)
+    if prompt is None:
         return state
+    return _planner_apply(state, bg, await _ainvoke(state, cfg, "planner", prompt))
 
-    # Generate a targeted query
-    llm = _llm()
-    query_prompt = f"{QUERY_WRITER_PROMPT}\n\nQuestion: {state['question']}\nPlan: {state.get('plan','')}\nCritique: {state.get('critique','')}\n"
+
+def _query_prompt(state: AgentState, cfg: RunConfig, bg: BudgetGuard) -> str:
     # For the first iteration, or if simple, maybe just use question? 
     # But let's use the LLM to refine it every time.
-    search_query = llm.invoke(query_prompt).content.strip()
-
-    max_results = env_int("DDG_MAX_RESULTS", 5)
-    region = os.getenv("DDG_REGION", "wt-wt")
-    safesearch = os.getenv("DDG_SAFESEARCH", "moderate")
-    timelimit = os.getenv("DDG_TIME_LIMIT", "y")
-
-    results = []
-    with DDGS() as ddgs:
-        # Use simple error handling for empty results
-        try:
-             # Use the generated search_query
-            for r in ddgs.text(search_query, region=region, safesearch=safesearch, timelimit=timelimit, max_results=max_results):
-                results.append(r)
-        except Exception as e:
-            # Fallback to original question if query failed or returned nothing logic could be added here
-            pass
-
+    return bg.fit_prompt(state, [
+        (f"{QUERY_WRITER_PROMPT.replace('{K}', str(cfg.research_queries))}\n\nQuestion: {state['question']}\nPlan: ", False),
+        (state.get('plan',''), True),
+        ("\nCritique: ", False),
+        (state.get('critique',''), True),
+        ("\n", False),
+    ], "query writer prompt")
+
+def _search_params(cfg: RunConfig) -> dict:
+    return {
+        "region": cfg.ddg_region,
+        "safesearch": cfg.ddg_safesearch,
+        "timelimit": cfg.ddg_time_limit,
+        "max_results": cfg.ddg_max_results,
+        "providers": cfg.search_providers,
+        "timeout": cfg.search_timeout_secs,
+    }
+
+_QUERY_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])?\s*(?:query\s*\d*\s*:)?\s*", re.IGNORECASE)
+
+def _parse_queries(text: str, limit: int, fallback: str) -> list:
+    '''One query per line; bullets/numbering/quotes stripped, near-identical queries dropped.'''
+    queries, seen = [], set()
+    for line in (text or "").splitlines():
+        q = _QUERY_BULLET.sub("", line).strip().strip("\"'`").strip()
+        if not q or q.endswith(":"):
+            continue
+        key = normalize_query(q)
+        if key and key not in seen:
+            seen.add(key)
+            queries.append(q)
+    return queries[:max(1, limit)] or [fallback]
+
+def _plan_searches(state: AgentState, bg: BudgetGuard, queries: list, params: dict, prefetched: dict = None):
+    '''
+    Returns ({query: cached results}, [queries needing a live search]).
+    Cached result sets are free: only live searches count against BUDGET_MAX_SEARCH_CALLS, charged
+    in query order. Queries past the limit are dropped; running out of searches is not a budget stop,
+    the run carries on with the sources it already has.
+    Queries searched speculatively (`prefetched`) are charged as live searches even though their
+    results are in the search cache by now.
+    '''
+    prefetched = prefetched or {}
+    cached, live = {}, []
+    for q in queries:
+        results = None if q in prefetched else cached_search(q, **params)
+        if results is not None:
+            bg.count_cache(state, "search", "hit")
+            cached[q] = results
+            continue
+        if not bg.can_search_more(state):
+            break
+        bg.count_cache(state, "search", "miss")
+        bg.inc_search(state)
+        if bg.is_stopped(state):
+            break
+        live.append(q)
+    return cached, live
+
+def _interleave(queries: list, found: dict) -> list:
+    # Round-robin over the queries' result lists so each query's top hits come first
+    # (fetching stops at BUDGET_MAX_PAGES_FETCHED, in source order).
+    lists = [found.get(q) or [] for q in queries]
+    merged = []
+    for rank in range(max((len(l) for l in lists), default=0)):
+        merged.extend(l[rank] for l in lists if rank < len(l))
+    return merged
+
+def _merge_results(state: AgentState, results: list, max_chars: int):
+    # URLs are compared canonically, so http/https, "www." and tracking-parameter variants of a
+    # page already listed are dropped before anything is fetched.
     existing_sources = state.get("sources", [])
-    existing_urls = {s["url"] for s in existing_sources}
+    existing_urls = {canonical_url(s["url"]) for s in existing_sources}
     next_id = 1
     if existing_sources:
         # Calculate next ID based on existing ones
@@ -91,178 +234,663 @@ def research_node(state: AgentState) -> AgentState:
         if start_ids:
             next_id = max(start_ids) + 1
     new_sources = []
+    collapsed = 0
     for r in results:
         url = r.get("href", "")
-        if url not in existing_urls:
+        key = canonical_url(url)
+        if key in existing_urls:
+            collapsed += 1
+        else:
             new_sources.append({
                 "id": f"S{next_id}",
                 "url": url,
                 "title": r.get("title", "") or f"Result {next_id}",
                 "snippet": r.get("body", "") or "",
             })
-            existing_urls.add(url)
+            # Local index hits carry their full text; _plan_fetches then skips the fetch.
+            if r.get("content"):
+                _keep_text(new_sources[-1], r["content"][:max_chars])
+            existing_urls.add(key)
             next_id += 1
+    if collapsed:
+        annotate(duplicate_urls=collapsed)
     state["sources"] = existing_sources + new_sources
 
-    # 2) Fetch a small number of pages
-    timeout = env_int("HTTP_TIMEOUT_SECS", 15)
-    max_chars = env_int("BUDGET_MAX_CHARS_PER_PAGE", 12000)
+def _keep_text(source: Source, text: str):
+    # Page text lives in the content store; the state only references it.
+    source["content_hash"] = content_store().put(text)
+    source["content_chars"] = len(text)
+
+def _source_text(source: Source):
+    return content_store().get(source.get("content_hash"))
 
-    fetched_blocks = []
+def _plan_fetches(state: AgentState, bg: BudgetGuard) -> list:
+    '''
+    Budget accounting happens up front, in source order, exactly as if fetching one by one;
+    only the network I/O itself runs concurrently. Returns [(source, cached_text or None)].
+    '''
+    planned = []
     for s in state["sources"]:
         if bg.is_stopped(state):
             break
 
-        # Check if we already have content
-        if s.get("content"):
-            fetched_blocks.append(
-                f"[{s['id']}] {s['title']}\nURL: {s['url']}\nEXTRACT:\n{s['content']}\n"
-            )
+        if s.get("duplicate_of"):
             continue
 
+        # Check if we already have content (text evicted from the store is fetched again)
+        text = _source_text(s)
+        if text is not None:
+            planned.append((s, text))
+            continue
+
+        # Past the page budget the remaining sources stay snippet-only; that is not a budget stop.
         if not bg.can_fetch_more(state):
-            bg.stop(state, "Page fetch limit exceeded.")
-            break
+            continue
 
         if not s["url"]:
             continue
 
         bg.inc_fetch(state)
-
-        try:
-            text = fetch_page_text(s["url"], timeout=timeout, max_chars=max_chars)
-            s["content"] = text # Cache it
+        planned.append((s, None))
+    return planned
+
+def _fetch_args(cfg: RunConfig, planned: list) -> dict:
+    return {
+        "urls": [s["url"] for s, text in planned if text is None],
+        "timeout": cfg.http_timeout_secs,
+        "max_chars": cfg.max_chars_per_page,
+    }
+
+def _collect_pages(state: AgentState, bg: BudgetGuard, planned: list, pages: dict) -> list:
+    '''Returns [(source, text or None)] in source order; None means the fetch failed.'''
+    collected = []
+    for s, text in planned:
+        if text is None:
+            page = pages.get(s["url"])
+            if isinstance(page, tuple):
+                text, cache_status = page
+                bg.count_cache(state, "pages", cache_status)
+                _keep_text(s, text)
+        collected.append((s, text))
+    return collected
+
+def _drop_near_duplicates(state: AgentState, cfg: RunConfig, collected: list) -> list:
+    '''
+    Fingerprints newly collected pages (SimHash) and marks each one that nearly matches an earlier
+    source as `duplicate_of` that source; those are left out of the prompts and reference lists.
+    Sources are never renumbered, and ones already fingerprinted keep their status, so [S#]
+    citations stay valid across iterations. Returns `collected` without the duplicates.
+    '''
+    seen = [(s["id"], s["simhash"]) for s in state["sources"] if s.get("simhash") is not None and not s.get("duplicate_of")]
+    kept, dropped = [], 0
+    for s, text in collected:
+        if text and "simhash" not in s:
+            s["simhash"] = fingerprint = simhash(text)
+            original = near_duplicate_of(fingerprint, seen, cfg.dedupe_max_distance)
+            if original is not None:
+                s["duplicate_of"] = original
+                s.pop("content_hash", None) # The surviving source holds the text.
+                s.pop("content_chars", None)
+                dropped += 1
+                continue
+            if fingerprint is not None:
+                seen.append((s["id"], fingerprint))
+        kept.append((s, text))
+    if dropped:
+        annotate(near_duplicates=dropped)
+    return kept
+
+def _fetched_blocks(state: AgentState, cfg: RunConfig, bg: BudgetGuard, collected: list) -> list:
+    '''
+    Only the page chunks that best match the question and plan (BM25) go into the prompt,
+    within RESEARCH_TOP_K_CHUNKS / RESEARCH_CONTEXT_TOKENS; every fetched source keeps its best
+    chunk unless even that is over the token budget, in which case its snippet stands in.
+    Each source's first selected chunk (or that snippet) is kept as its digest in state["source_digests"];
+    the draft prompt quotes the digests as source extracts, and their keys mark sources already
+    synthesized, so a source left out is not ranked again on every later pass.
+    '''
+    selected = select_chunks(
+        [(s["id"], text) for s, text in collected if text],
+        query=f"{state['question']}\n{state.get('plan', '')}",
+        chunk_chars=cfg.research_chunk_chars,
+        top_k=cfg.research_top_k_chunks,
+        token_budget=cfg.research_context_tokens,
+        count_tokens=bg.counter.count,
+    )
+    digests = state.setdefault("source_digests", {})
+    digest_chars = cfg.research_digest_chars
+    fetched_blocks, over_budget = [], 0
+    for s, text in collected:
+        if text is None:
             fetched_blocks.append(
-                f"[{s['id']}] {s['title']}\nURL: {s['url']}\nEXTRACT:\n{text}\n"
+                f"[{s['id']}] {s['title']}\nURL: {s['url']}\nEXTRACT: (failed to fetch)\n"
             )
-            bg.add_tokens(state, text, f"fetch {s['id']}")
-        except Exception:
+        elif s["id"] in selected:
+            extract = "\n...\n".join(selected[s["id"]])
+            digests[s["id"]] = selected[s["id"]][0][:digest_chars]
             fetched_blocks.append(
-                f"[{s['id']}] {s['title']}\nURL: {s['url']}\nEXTRACT: (failed to fetch)\n"
+                f"[{s['id']}] {s['title']}\nURL: {s['url']}\nEXTRACT:\n{extract}\n"
             )
-
-    # 3) Synthesize notes
-    llm = _llm()
+        elif text:
+            over_budget += 1
+            digests[s["id"]] = (s.get("snippet") or "")[:digest_chars]
+            fetched_blocks.append(
+                f"[{s['id']}] {s['title']}\nURL: {s['url']}\nEXTRACT: (over the context budget) {s.get('snippet') or ''}\n"
+            )
+    if over_budget:
+        annotate(over_context_budget=over_budget)
+    return fetched_blocks
+
+def _research_prompt(state: AgentState, cfg: RunConfig, bg: BudgetGuard, collected: list):
+    '''
+    Incremental synthesis: only sources without a digest (i.e. not yet synthesized) are sent.
+    Later iterations ask for notes on the new evidence alone, which are appended to the existing
+    notes. The prompt lists the covered sources by id and title and quotes the existing notes only
+    up to RESEARCH_NOTES_CONTEXT_TOKENS, so an iteration costs in proportion to what it found
+    rather than to everything so far. Returns None when there is nothing to synthesize.
+    '''
+    digests = state.get("source_digests") or {}
+    new_sources = [s for s in distinct_sources(state["sources"]) if s["id"] not in digests]
+    new_pages = [(s, text) for s, text in collected if s["id"] not in digests]
+    if state["notes"] and not any(text for s, text in new_pages):
+        return None # No new evidence: keep the notes as they are.
+
+    fetched_blocks = _fetched_blocks(state, cfg, bg, new_pages)
     n_sources = len(state.get("sources", []))
-    prompt = (
-        f"{RESEARCH_PROMPT.replace('{N}', str(n_sources))}\n\n"
-        f"Question: {state['question']}\n\n"
-        f"Plan:\n{state['plan']}\n\n"
-        f"Sources (snippets):\n" +
-        "\n".join(f"[{s['id']}] {s['title']} — {s['snippet']}" for s in state["sources"]) +
-        "\n\nFetched text:\n" + "\n".join(fetched_blocks)
-    )
+    if state["notes"]:
+        covered = [s for s in distinct_sources(state["sources"]) if s["id"] in digests]
+        notes, _ = fit_parts(bg.counter, [(state["notes"], True)], cfg.research_notes_context_tokens)
+        parts = [
+            (f"{RESEARCH_UPDATE_PROMPT.replace('{N}', str(n_sources))}\n\nQuestion: {state['question']}\n\nAlready covered:\n", False),
+            ("\n".join(f"[{s['id']}] {s['title']}" for s in covered), True),
+            ("\n\nExisting notes (excerpt):\n", False),
+            (notes, True),
+        ]
+    else:
+        parts = [
+            (f"{RESEARCH_PROMPT.replace('{N}', str(n_sources))}\n\nQuestion: {state['question']}\n\nPlan:\n", False),
+            (state["plan"], True),
+        ]
+    parts += [
+        ("\n\nSources (snippets):\n", False),
+        ("\n".join(f"[{s['id']}] {s['title']} — {s['snippet']}" for s in new_sources), True),
+        ("\n\nFetched text:\n", False),
+        ("\n".join(fetched_blocks), True),
+    ]
+    prompt = bg.fit_prompt(state, parts, "research prompt")
     bg.add_tokens(state, prompt, "research prompt")
     if bg.is_stopped(state):
-        state["notes"] = "Budget stopped during research; proceed with uncertainty and verification steps."
+        if not state["notes"]:
+            state["notes"] = "Budget stopped during research; proceed with uncertainty and verification steps."
+        return None
+    return prompt
+
+def _research_apply(state: AgentState, bg: BudgetGuard, notes: str) -> AgentState:
+    bg.add_tokens(state, notes, "research notes output")
+    if state["notes"]:
+        state["notes"] = f"{state['notes']}\n\nNew findings (iteration {state['iteration'] + 1}):\n{notes}"
+    else:
+        state["notes"] = notes
+    return state
+
+def _take_prefetch(state: AgentState) -> dict:
+    # Speculative I/O is one-shot: it is only valid for the iteration it was prepared for.
+    spec = state.get("prefetch") or {}
+    state["prefetch"] = {}
+    return spec if spec.get("iteration") == state["iteration"] else {}
+
+def _replay_searches(spec: dict, live: list, found: dict) -> list:
+    '''Moves speculatively searched queries into `found`; returns the ones still to search.'''
+    prefetched = spec.get("searches") or {}
+    found.update((q, prefetched[q]) for q in live if q in prefetched)
+    return [q for q in live if q not in prefetched]
+
+def _replay_fetches(spec: dict, args: dict) -> tuple[dict, dict]:
+    '''Returns (pages fetched speculatively, fetch_pages args for the rest).'''
+    store = content_store()
+    pages = {}
+    for url, (h, cache_status) in (spec.get("pages") or {}).items():
+        text = store.get(h) if url in args["urls"] else None
+        if text is not None:
+            pages[url] = (text, cache_status)
+    return pages, {**args, "urls": [url for url in args["urls"] if url not in pages]}
+
+def _search_plan(state: AgentState, cfg: RunConfig, bg: BudgetGuard, spec: dict, text: str):
+    '''
+    The queries from the query writer's `text`, their cached or replayed results, and the queries
+    still to search live. Returns (queries, found, live, search params).
+    '''
+    queries = _parse_queries(text, cfg.research_queries, state["question"])
+    params = _search_params(cfg)
+    found, live = _plan_searches(state, bg, queries, params, spec.get("searches"))
+    return queries, found, _replay_searches(spec, live, found), params
+
+def _fetch_plan(state: AgentState, cfg: RunConfig, bg: BudgetGuard, spec: dict, queries: list, found: dict):
+    '''
+    Adds the search results to the sources and plans the page fetches.
+    Returns (planned, pages already fetched speculatively, fetch_pages args for the rest).
+    '''
+    if queries:
+        _merge_results(state, _interleave(queries, found), cfg.max_chars_per_page)
+    planned = _plan_fetches(state, bg)
+    pages, args = _replay_fetches(spec, _fetch_args(cfg, planned))
+    return planned, pages, args
+
+def _synthesis_prompt(state: AgentState, cfg: RunConfig, bg: BudgetGuard, planned: list, pages: dict):
+    collected = _drop_near_duplicates(state, cfg, _collect_pages(state, bg, planned, pages))
+    return _research_prompt(state, cfg, bg, collected)
+
+# The research and prefetch nodes share the helpers above; the sync and async versions differ only
+# in how they do LLM, search and fetch I/O. The helpers touch the SQLite caches and the content
+# store, so the async nodes run them in a worker thread.
+
+def research_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    bg = BudgetGuard(cfg)
+    if not state["research_enabled"] or bg.is_stopped(state):
         return state
 
-    state["notes"] = llm.invoke(prompt).content
-    bg.add_tokens(state, state["notes"], "research notes output")
-    return state
+    spec = _take_prefetch(state)
 
-def draft_node(state: AgentState) -> AgentState:
-    llm = _llm()
-    bg = BudgetGuard()
+    # 1) Search: several diverse queries from one LLM call, run concurrently. Once the search
+    # budget is spent, later passes fetch and synthesize the sources already found.
+    queries, found = [], {}
+    if bg.can_search_more(state):
+        prompt = _query_prompt(state, cfg, bg)
+        text = spec["query_text"] if spec.get("query_prompt") == prompt else _invoke(state, cfg, "query_writer", prompt)
+        queries, found, live, params = _search_plan(state, cfg, bg, spec, text)
+        found.update(zip(live, search_many(live, **params)))
 
+    # 2) Fetch a small number of pages
+    planned, pages, args = _fetch_plan(state, cfg, bg, spec, queries, found)
+    pages.update(fetch_pages(**args))
+
+    # 3) Synthesize notes
+    prompt = _synthesis_prompt(state, cfg, bg, planned, pages)
+    if prompt is None:
+        return state
+    return _research_apply(state, bg, _invoke(state, cfg, "research", prompt))
+
+async def aresearch_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    bg = BudgetGuard(cfg)
+    if not state["research_enabled"] or bg.is_stopped(state):
+        return state
+
+    spec = _take_prefetch(state)
+
+    queries, found = [], {}
+    if bg.can_search_more(state):
+        prompt = _query_prompt(state, cfg, bg)
+        if spec.get("query_prompt") == prompt:
+            text = spec["query_text"]
+        else:
+            text = await _ainvoke(state, cfg, "query_writer", prompt)
+        queries, found, live, params = await asyncio.to_thread(_search_plan, state, cfg, bg, spec, text)
+        found.update(zip(live, await asearch_many(live, **params)))
+
+    planned, pages, args = await asyncio.to_thread(_fetch_plan, state, cfg, bg, spec, queries, found)
+    pages.update(await afetch_pages(**args))
+
+    prompt = await asyncio.to_thread(_synthesis_prompt, state, cfg, bg, planned, pages)
+    if prompt is None:
+        return state
+    return _research_apply(state, bg, await _ainvoke(state, cfg, "research", prompt))
+
+
+def _draft_prompt(state: AgentState, bg: BudgetGuard) -> str:
     # If budget stopped earlier (e.g., during research), still draft but disable research mode.
     if bg.is_stopped(state):
         state["research_enabled"] = False
 
+    n_sources = len(state.get("sources", []))
+    head = f"{DRAFT_PROMPT.replace('{N}', str(n_sources))}\n\nQuestion:\n{state['question']}\n\n"
     if state["research_enabled"] and state["sources"] and state["notes"]:
-        context = (
-            f"Research notes:\n{state['notes']}\n\nSources:\n"
-            + "\n".join(f"[{s['id']}] {s['title']} — {s['url']}" for s in state["sources"])
-        )
+        # Notes and digests may be trimmed to fit; the source list stays whole so every [S#] remains citable.
+        sources = distinct_sources(state["sources"])
+        digests = state.get("source_digests") or {}
+        parts = [
+            (head + "Research notes:\n", False),
+            (state["notes"], True),
+            ("\n\nSources:\n" + "\n".join(f"[{s['id']}] {s['title']} — {s['url']}" for s in sources) + "\n", False),
+        ]
+        extracts = [f"[{s['id']}] {digests[s['id']]}" for s in sources if digests.get(s["id"])]
+        if extracts:
+            parts += [("\nSource extracts:\n", False), ("\n".join(extracts), True), ("\n", False)]
     else:
-        context = "Research unavailable/blocked. Be cautious and include verification steps."
+        parts = [(head + "Research unavailable/blocked. Be cautious and include verification steps.\n", False)]
 
-    n_sources = len(state.get("sources", []))
-    prompt = f"{DRAFT_PROMPT.replace('{N}', str(n_sources))}\n\nQuestion:\n{state['question']}\n\n{context}\n"
+    prompt = bg.fit_prompt(state, parts, "draft prompt")
     bg.add_tokens(state, prompt, "draft prompt")
+    return prompt
 
-    state["draft"] = llm.invoke(prompt).content
-    
-    # Force cleaning of "How to Verify" if research is enabled
-    if state["research_enabled"]:
-        state["draft"] = re.sub(
-            r"(?i)(\n|^)\s*(#{1,6}|[*_]{2})\s*How to verify.*?((?=\n\s*#{1,6})|\Z)", 
-            "", 
-            state["draft"], 
-            flags=re.DOTALL
-        ).strip()
-    
+def _draft_apply(state: AgentState, bg: BudgetGuard, draft: str) -> AgentState:
+    state["draft"] = _strip_how_to_verify(state, draft)
     bg.add_tokens(state, state["draft"], "draft output")
     return state
 
+def draft_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    bg = BudgetGuard(cfg)
+    prompt = _draft_prompt(state, bg)
+    return _draft_apply(state, bg, _invoke(state, cfg, "draft", prompt))
+
+async def adraft_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    bg = BudgetGuard(cfg)
+    prompt = _draft_prompt(state, bg)
+    return _draft_apply(state, bg, await _ainvoke(state, cfg, "draft", prompt))
+
 
-def critique_node(state: AgentState) -> AgentState:
-    llm = _llm()
-    bg = BudgetGuard()
-    qg = QualityGate()
+CRITIQUE_SKIPPED = "Budget stopped; skipping critique."
+_GATE_MARK = "\n\n[QualityGate]\n"  # review appends the gate feedback to the critique after this
 
+def _critique_prompt(state: AgentState, bg: BudgetGuard):
     # LLM critique (Reflexion)
-    prompt = f"{CRITIQUE_PROMPT}\n\nQuestion:\n{state['question']}\n\nDraft:\n{state['draft']}\n"
+    prompt = bg.fit_prompt(state, [
+        (f"{CRITIQUE_PROMPT}\n\nQuestion:\n{state['question']}\n\nDraft:\n", False),
+        (state["draft"], True),
+        ("\n", False),
+    ], "critique prompt")
     bg.add_tokens(state, prompt, "critique prompt")
 
     if bg.is_stopped(state):
-        state["critique"] = "Budget stopped; skipping critique."
-        state["quality_score"] = 0
-        return state
+        state["critique"] = CRITIQUE_SKIPPED
+        return None
+    return prompt
 
-    critique = llm.invoke(prompt).content
+def _critique_apply(state: AgentState, bg: BudgetGuard, critique: str) -> dict:
     bg.add_tokens(state, critique, "critique output")
-
-    # Rule-based Quality Gate overlays the critique
-    score, gate_feedback = qg.check(state, state["draft"])
-    state["quality_score"] = score
-    state["critique"] = f"{critique}\n\n[QualityGate]\nScore={score}\n{gate_feedback}"
+    state["critique"] = critique
+    return _critique_out(state)
+
+def _critique_out(state: AgentState) -> dict:
+    # critique runs in parallel with gate, so it returns only the keys it owns.
+    return {"critique": state["critique"], "budget": state["budget"]}
+
+def critique_node(state: AgentState, cfg: RunConfig) -> dict:
+    bg = BudgetGuard(cfg)
+    prompt = _critique_prompt(state, bg)
+    if prompt is None:
+        return _critique_out(state)
+    return _critique_apply(state, bg, _invoke(state, cfg, "critique", prompt))
+
+async def acritique_node(state: AgentState, cfg: RunConfig) -> dict:
+    bg = BudgetGuard(cfg)
+    prompt = _critique_prompt(state, bg)
+    if prompt is None:
+        return _critique_out(state)
+    return _critique_apply(state, bg, await _ainvoke(state, cfg, "critique", prompt))
+
+
+def gate_node(state: AgentState, cfg: RunConfig) -> dict:
+    # Rule-based Quality Gate; needs only the draft, so it runs alongside the LLM critique.
+    score, feedback = QualityGate(cfg).check(state, state["draft"])
+    return {"gate_score": score, "gate_feedback": feedback}
+
+async def agate_node(state: AgentState, cfg: RunConfig) -> dict:
+    # Pure rule checks; no I/O to await.
+    return gate_node(state, cfg)
+
+
+def review_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    # Joins critique and gate: the quality score combines the gate score with the critique's own
+    # score and is added to the score history; the gate feedback overlays the critique.
+    if state["critique"] == CRITIQUE_SKIPPED:
+        state["quality_score"] = 0
+        return state
+    score = state["gate_score"]
+    llm_score = parse_llm_score(state["critique"])
+    state["quality_score"] = StopController(cfg).record(state, score, llm_score)
+    annotate(gate_score=score, llm_score=llm_score, quality_score=state["quality_score"])
+    state["critique"] = f"{state['critique']}{_GATE_MARK}Score={score}\n{state['gate_feedback']}"
     return state
 
-def revise_node(state: AgentState) -> AgentState:
-    llm = _llm()
-    bg = BudgetGuard()
+async def areview_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    # Pure bookkeeping; no I/O to await.
+    return review_node(state, cfg)
 
+
+def _revise_prompt(state: AgentState, bg: BudgetGuard):
     n_sources = len(state.get("sources", []))
-    prompt = f"{REVISE_PROMPT.replace('{N}', str(n_sources))}\n\nDraft:\n{state['draft']}\n\nCritique:\n{state['critique']}\n"
+    # The draft is rewritten from, so only the critique may be trimmed.
+    prompt = bg.fit_prompt(state, [
+        (f"{REVISE_PROMPT.replace('{N}', str(n_sources))}\n\nDraft:\n{state['draft']}\n\nCritique:\n", False),
+        (state["critique"], True),
+        ("\n", False),
+    ], "revise prompt")
     bg.add_tokens(state, prompt, "revise prompt")
     if bg.is_stopped(state):
         state["revision"] = state["draft"]
-        return state
-
-    state["revision"] = llm.invoke(prompt).content
-    
-    # Force cleaning of "How to Verify" if research is enabled
-    if state["research_enabled"]:
-        state["revision"] = re.sub(
-            r"(?i)(\n|^)\s*(#{1,6}|[*_]{2})\s*How to verify.*?((?=\n\s*#{1,6})|\Z)", 
-            "", 
-            state["revision"], 
-            flags=re.DOTALL
-        ).strip()
+        return None
+    return prompt
 
+def _revise_apply(state: AgentState, bg: BudgetGuard, revision: str) -> dict:
+    state["revision"] = _strip_how_to_verify(state, revision)
     bg.add_tokens(state, state["revision"], "revise output")
 
     # After revision, treat revision as the new draft
     state["draft"] = state["revision"]
-    return state
-
-def decide_node(state: AgentState) -> AgentState:
-    state["iteration"] += 1
-    max_iters = env_int("MAX_ITERS", 3)
-    min_score = env_int("EARLY_STOP_MIN_SCORE", 8)
+    return _revise_out(state)
+
+def _revise_out(state: AgentState) -> dict:
+    # revise runs in parallel with prefetch, so it returns only the keys it owns.
+    return {"revision": state["revision"], "draft": state["draft"], "budget": state["budget"]}
+
+_QUOTED = re.compile(r"[\"“]([^\"”\n]{12,})[\"”]")
+_FIX = re.compile(r"^\s*[-*•]\s+(.+)$", re.MULTILINE)
+_NO_FIX = re.compile(r"^(?:none|n/?a|nothing\b.*|no (?:further |major )?(?:fixes|changes|issues)\b.*)$", re.IGNORECASE)
+
+def _names_heading(heading: str):
+    # The critique names a section only explicitly: a quoted or bold heading, "## Heading",
+    # "section Heading" or "the Heading section" -- a heading word in the prose does not count.
+    h = re.escape(heading.strip())
+    return re.compile(
+        rf"[\"'`“‘]{h}[\"'`”’]|\*\*{h}\*\*|#{{1,6}}\s*{h}(?!\w)|\bsection\s*:?\s*{h}(?!\w)|(?<!\w){h}\s+section\b",
+        re.IGNORECASE,
+    )
 
-    if state["budget"]["stopped"]:
-        state["decision"] = "stop"
-        return state
+def _critique_fixes(critique: str):
+    '''
+    The bullets of the critique's fix list (not the gate feedback review appends); [] when the
+    list says "- None", or None when the critique has no bullets, i.e. its fixes are in the prose.
+    '''
+    bullets = [m.group(1).strip() for m in _FIX.finditer(critique.split(_GATE_MARK, 1)[0])]
+    if not bullets:
+        return None
+    return [fix for fix in bullets if not _NO_FIX.match(fix.strip(" .*_"))]
+
+def _named_sections(sections: list, patterns: list, text: str) -> set:
+    # Sections named by heading or quoted in `text`.
+    named = {i for i, pattern in enumerate(patterns) if pattern is not None and pattern.search(text)}
+    for quote in _QUOTED.findall(text):
+        named.update(i for i, section in enumerate(sections) if quote in section.text)
+    return named
+
+def _revise_targets(state: AgentState, cfg: RunConfig):
+    '''
+    For REVISE_MODE=sections: the draft's sections and {section index: [issues]} for the ones to
+    regenerate, or None for a full rewrite (single-section draft, research off, no citations at
+    all, a critique fix that names no section, or every section flagged). An empty {} -- the gate
+    found nothing and the critique's fix list is "- None" -- means the draft is kept as is.
+    '''
+    if cfg.revise_mode != "sections" or not state["research_enabled"] or not cfg.require_citations:
+        return None
+    sections = split_sections(state["draft"])
+    report = analyze(state["draft"], (s["id"] for s in distinct_sources(state.get("sources", []))))
+    if len(sections) < 2 or not report.has_citations:
+        return None
+
+    # Line-level gate findings, then the sections each critique fix names by heading or quotes.
+    flagged = {}
+    dangling = set(report.dangling_ids)
+    for claim in report.claims:
+        if dangling.intersection(claim.cited):
+            issue = f"Cites a source that does not exist: {claim.text}"
+        elif claim.numeric and not claim.cited:
+            issue = f"Numeric/dated claim without a citation: {claim.text}"
+        else:
+            continue
+        flagged.setdefault(section_at(sections, claim.line), []).append(issue)
+    patterns = [_names_heading(section.heading) if section.heading.strip() else None for section in sections]
+    fixes = _critique_fixes(state["critique"])
+    if fixes is None:
+        # No fix list: flag what the prose names; if it names nothing it cannot be placed.
+        named = _named_sections(sections, patterns, state["critique"].split(_GATE_MARK, 1)[0])
+        if not named and not flagged:
+            return None
+        for i in named:
+            flagged.setdefault(i, []).append("Named in the critique.")
+    for fix in fixes or []:
+        named = _named_sections(sections, patterns, fix)
+        if not named:
+            return None  # a fix we cannot place would otherwise be dropped
+        for i in named:
+            flagged.setdefault(i, []).append(f"From the critique: {fix}")
+
+    if len(flagged) == len(sections):
+        return None
+    return sections, flagged
+
+def _section_prompts(state: AgentState, bg: BudgetGuard, sections: list, flagged: dict) -> list:
+    # One prompt per flagged section, in draft order, until the budget trips.
+    header = REVISE_SECTION_PROMPT.replace("{N}", str(len(state.get("sources", []))))
+    prompts = []
+    for i in sorted(flagged):
+        issues = "\n".join(f"- {issue}" for issue in flagged[i])
+        prompt = bg.fit_prompt(state, [
+            (f"{header}\nQuestion:\n{state['question']}\n\nIssues in this section:\n{issues}\n\n"
+             f"Section:\n{sections[i].text.strip()}\n\nCritique:\n", False),
+            (state["critique"], True),
+            ("\n", False),
+        ], "revise prompt")
+        bg.add_tokens(state, prompt, "revise prompt")
+        if bg.is_stopped(state):
+            break
+        prompts.append((i, prompt))
+    return prompts
+
+def _stitch(section: Section, text: str) -> str:
+    # A revised section in place of the original, keeping its heading and trailing blank lines.
+    text = text.strip()
+    if not text:
+        return section.text
+    if section.heading and not text.startswith("#"):
+        text = section.text.split("\n", 1)[0] + "\n" + text
+    return text + section.text[len(section.text.rstrip("\n")):]
+
+def _revise_sections_apply(state: AgentState, bg: BudgetGuard, sections: list, revised: list) -> dict:
+    texts = [section.text for section in sections]
+    for i, text in revised:
+        bg.add_tokens(state, text, "revise output")
+        texts[i] = _stitch(sections[i], text)
+    annotate(sections=len(sections), revised_sections=len(revised))
+    state["revision"] = _strip_how_to_verify(state, join_sections(texts))
+    state["draft"] = state["revision"]
+    return _revise_out(state)
+
+def revise_node(state: AgentState, cfg: RunConfig) -> dict:
+    bg = BudgetGuard(cfg)
+    targets = _revise_targets(state, cfg)
+    if targets is not None:
+        # Section calls are not streamed: the fragments would replace the draft in a live view.
+        sections, flagged = targets
+        prompts = _section_prompts(state, bg, sections, flagged)
+        revised = [(i, _invoke(state, cfg, "revise", prompt, stream=False)) for i, prompt in prompts]
+        return _revise_sections_apply(state, bg, sections, revised)
+    prompt = _revise_prompt(state, bg)
+    if prompt is None:
+        return _revise_out(state)
+    return _revise_apply(state, bg, _invoke(state, cfg, "revise", prompt))
+
+async def arevise_node(state: AgentState, cfg: RunConfig) -> dict:
+    bg = BudgetGuard(cfg)
+    targets = _revise_targets(state, cfg)
+    if targets is not None:
+        sections, flagged = targets
+        prompts = _section_prompts(state, bg, sections, flagged)
+        texts = await asyncio.gather(*(_ainvoke(state, cfg, "revise", prompt, stream=False) for _, prompt in prompts))
+        return _revise_sections_apply(state, bg, sections, [(i, text) for (i, _), text in zip(prompts, texts)])
+    prompt = _revise_prompt(state, bg)
+    if prompt is None:
+        return _revise_out(state)
+    return _revise_apply(state, bg, await _ainvoke(state, cfg, "revise", prompt))
+
+
+def _will_research_again(state: AgentState, cfg: RunConfig) -> bool:
+    # What decide_node will conclude after revise; only revise's own token use can still stop the run.
+    return (
+        cfg.speculative_research
+        and state["research_enabled"]
+        and not StopController(cfg).stop_reason(state, state["iteration"] + 1)
+        and _revise_fits_budget(state, cfg)
+    )
 
-    if state["quality_score"] >= min_score:
-        state["decision"] = "stop"
-        return state
+def _revise_fits_budget(state: AgentState, cfg: RunConfig) -> bool:
+    # Revise tripping the token budget stops the run and wastes the prefetch, so speculate only
+    # when its likely use (the draft in and out, plus the critique) leaves the budget intact.
+    bg = BudgetGuard(cfg)
+    expected = 2 * bg.counter.count(state["draft"]) + bg.counter.count(state["critique"])
+    return state["budget"]["token_estimate"] + expected <= bg.max_token_estimate
+
+def _prefetched(state: AgentState, prompt: str, text: str, live: list, found: dict, pages: dict) -> dict:
+    return {
+        "iteration": state["iteration"] + 1,
+        "query_prompt": prompt,
+        "query_text": text,
+        "searches": {q: found[q] for q in live},
+        # Page text goes to the content store; the state keeps [hash, cache status].
+        "pages": {
+            url: [content_store().put(page[0]), page[1]] for url, page in pages.items() if isinstance(page, tuple)
+        },
+    }
+
+def prefetch_node(state: AgentState, cfg: RunConfig) -> dict:
+    '''
+    Speculative research for the next iteration, run alongside revise when another iteration is
+    predicted: writes the queries and makes the searches and page fetches the next research pass
+    would make. Works on this node's private copy of the state, so nothing is charged here;
+    research_node replays the stored results through its usual budget planning (only what it uses
+    is charged) and decide_node discards them if the run stops instead.
+    '''
+    if not _will_research_again(state, cfg):
+        return {"prefetch": {}}
+    bg = BudgetGuard(cfg)
+    prompt, text, queries, found, live = "", "", [], {}, []
+    if bg.can_search_more(state):
+        prompt = _query_prompt(state, cfg, bg)
+        text = _invoke(state, cfg, "query_writer", prompt)
+        queries, found, live, params = _search_plan(state, cfg, bg, {}, text)
+        found.update(zip(live, search_many(live, **params)))
+    _, _, args = _fetch_plan(state, cfg, bg, {}, queries, found)
+    pages = fetch_pages(**args, deadline_secs=cfg.prefetch_deadline_secs)
+    return {"prefetch": _prefetched(state, prompt, text, live, found, pages)}
+
+async def aprefetch_node(state: AgentState, cfg: RunConfig) -> dict:
+    if not _will_research_again(state, cfg):
+        return {"prefetch": {}}
+    bg = BudgetGuard(cfg)
+    prompt, text, queries, found, live = "", "", [], {}, []
+    if bg.can_search_more(state):
+        prompt = _query_prompt(state, cfg, bg)
+        text = await _ainvoke(state, cfg, "query_writer", prompt)
+        queries, found, live, params = await asyncio.to_thread(_search_plan, state, cfg, bg, {}, text)
+        found.update(zip(live, await asearch_many(live, **params)))
+    _, _, args = await asyncio.to_thread(_fetch_plan, state, cfg, bg, {}, queries, found)
+    pages = await afetch_pages(**args, deadline_secs=cfg.prefetch_deadline_secs)
+    return {"prefetch": await asyncio.to_thread(_prefetched, state, prompt, text, live, found, pages)}
+
+
+def decide_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    state["iteration"] += 1
 
-    if state["iteration"] >= max_iters:
+    reason = StopController(cfg).stop_reason(state, state["iteration"])
+    if reason:
+        annotate(stop_reason=reason)
         state["decision"] = "stop"
+        state["stop_reason"] = reason
+        state["prefetch"] = {} # Speculative results go unused and uncharged.
         return state
 
     state["decision"] = "continue"
-    return state
\ No newline at end of file
+    return state
+
+async def adecide_node(state: AgentState, cfg: RunConfig) -> AgentState:
+    # Pure bookkeeping; no I/O to await.
+    return decide_node(state, cfg)
@@ -9,9 +9,10 @@ Return only the plan.
 """
 
 QUERY_WRITER_PROMPT = """You are a search query generator.
-Given the user's question, the current plan, and any previous critique, generate a targeted search query to find missing information.
+Given the user's question, the current plan, and any previous critique, generate up to {K} targeted search queries to find missing information.
+Make them diverse: each query should cover a different aspect, angle or source type, not rephrase another one.
 
-Return ONLY the search query (no quotes, no preamble).
+Return ONLY the search queries, one per line (no numbering, no quotes, no preamble).
 """
 
 RESEARCH_PROMPT = """You are a research synthesis module.
@@ -24,6 +25,16 @@ Given the user question, plan, and a list of sources (snippets + fetched text),
 Return only research notes.
 """
 
+RESEARCH_UPDATE_PROMPT = """You are a research synthesis module, updating existing notes.
+- Use ONLY the provided sources and ONLY these citation markers: [S1]...[S{N}].
+Given the user question, the sources already covered, an (abridged) excerpt of the existing notes, and NEW sources (snippets + fetched text), write concise notes covering only what the new sources add:
+- new findings
+- points where they confirm or contradict what is already covered
+- which sources support which points (use [S#] markers)
+
+Do not repeat the existing notes. Return only the new notes.
+"""
+
 DRAFT_PROMPT = """You are the drafting module.
 Write a helpful, structured answer in Markdown.
 
@@ -51,7 +62,8 @@ Evaluate the draft for:
 Return:
 1) quality_score (0-10)
 2) short critique
-3) prioritized fix list (bullets)
+3) prioritized fix list: one "- " bullet per fix, each starting with the "## Heading" of the draft section it
+   applies to (or "## Whole draft" when it spans sections); "- None" if the draft needs no changes
 """
 
 REVISE_PROMPT = """You are the revision module.
@@ -68,4 +80,16 @@ Hard rules:
   - Keep uncertainty language and include "How to verify".
 
 Return only the revised draft (no extra commentary).
+"""
+
+REVISE_SECTION_PROMPT = """You are the revision module, fixing one section of a longer draft.
+Rewrite ONLY the section below so that it resolves the listed issues and any critique points about it.
+Leave the rest of the section as it is.
+
+Hard rules:
+- Use ONLY the provided sources and ONLY these citation markers: [S1]...[S{N}].
+- Do NOT invent sources, titles, authors, years, or citation IDs.
+- Keep the section's heading line unchanged, and do not add other sections or a "References" section.
+
+Return only the revised section (no extra commentary).
 """
\ No newline at end of file
@@ -0,0 +1,106 @@
+import math
+import re
+from collections import Counter
+
+from .utils import rough_token_estimation
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was "
+    "were what when where which who why will with does do can you your i we our".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [w for w in _WORD.findall((text or "").lower()) if w not in _STOPWORDS]
+
+
+def split_chunks(text: str, max_chars: int) -> list[str]:
+    '''Split extracted page text into ~max_chars chunks on line boundaries (long lines are cut).'''
+    chunks, buf, size = [], [], 0
+    for line in (text or "").splitlines():
+        line = line.strip()
+        while len(line) > max_chars:
+            if buf:
+                chunks.append("\n".join(buf))
+                buf, size = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if not line:
+            continue
+        if size + len(line) > max_chars and buf:
+            chunks.append("\n".join(buf))
+            buf, size = [], 0
+        buf.append(line)
+        size += len(line) + 1
+    if buf:
+        chunks.append("\n".join(buf))
+    return chunks
+
+
+def bm25_scores(query: str, docs: list[str], k1: float = 1.5, b: float = 0.75) -> list[float]:
+    doc_tokens = [tokenize(d) for d in docs]
+    if not doc_tokens:
+        return []
+    avgdl = sum(len(t) for t in doc_tokens) / len(doc_tokens) or 1.0
+    df = Counter()
+    for toks in doc_tokens:
+        df.update(set(toks))
+    n = len(doc_tokens)
+    q_terms = set(tokenize(query))
+
+    scores = []
+    for toks in doc_tokens:
+        tf = Counter(toks)
+        dl = len(toks) or 1
+        score = 0.0
+        for term in q_terms:
+            if term not in tf:
+                continue
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * dl / avgdl))
+        scores.append(score)
+    return scores
+
+
+def select_chunks(
+    pages: list[tuple[str, str]], query: str, chunk_chars: int, top_k: int, token_budget: int,
+    count_tokens=rough_token_estimation,
+) -> dict:
+    '''
+    Rank chunks of every page against `query` with BM25 and keep the best ones within
+    `top_k` chunks and `token_budget` tokens (as counted by `count_tokens`).
+    Each page's single best chunk is reserved first, even past `top_k`; only a page whose best
+    chunk no longer fits the token budget is left out (callers fall back to its snippet).
+    Remaining `top_k` slots go to the highest-scoring chunks overall.
+    Returns {page_key: [chunk, ...]} with each page's chunks in their original order.
+    '''
+    chunks = []  # (key, position, text)
+    for key, text in pages:
+        for pos, chunk in enumerate(split_chunks(text, chunk_chars)):
+            chunks.append((key, pos, chunk))
+    if not chunks:
+        return {}
+
+    scores = bm25_scores(query, [c[2] for c in chunks])
+    ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+
+    best_per_page = {}
+    for i in ranked:
+        best_per_page.setdefault(chunks[i][0], i)
+    firsts = set(best_per_page.values())
+
+    chosen, used = [], 0
+    for i in list(best_per_page.values()) + [i for i in ranked if i not in firsts]:
+        if i not in firsts and len(chosen) >= top_k:
+            break
+        cost = count_tokens(chunks[i][2])
+        if chosen and used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+
+    selected = {}
+    for i in sorted(chosen, key=lambda i: (chunks[i][0], chunks[i][1])):
+        selected.setdefault(chunks[i][0], []).append(chunks[i][2])
+    return selected
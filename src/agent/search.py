@@ -0,0 +1,173 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+
+from ddgs import DDGS
+
+from .cache import search_cache
+from .index import local_index
+from .tracing import span
+
+_WS = re.compile(r"\s+")
+_PROVIDERS = {}
+_PROVIDERS_LOCK = threading.Lock()
+# Provider calls run here so a hung backend can be abandoned after its timeout.
+_CALLS = ThreadPoolExecutor(max_workers=16, thread_name_prefix="search-call")
+
+
+def normalize_query(query: str) -> str:
+    '''Lowercase, collapse whitespace and drop wrapping quotes/trailing punctuation.'''
+    q = _WS.sub(" ", (query or "").strip().lower())
+    return q.strip("\"'`").rstrip("?.!").strip()
+
+
+class SearchProvider:
+    '''
+    A search backend. search() returns result dicts {"title", "href", "body"} and may add
+    "content" (full text, so the page needs no fetch). Errors are raised, not swallowed;
+    FallbackProvider decides what happens next.
+    '''
+
+    name = "base"
+    cacheable = True  # worth storing in the search cache (remote, slow or rate-limited)
+
+    def search(self, query: str, region: str, safesearch: str, timelimit: str, max_results: int) -> list:
+        raise NotImplementedError
+
+
+class DDGSProvider(SearchProvider):
+    name = "ddgs"
+
+    def search(self, query, region, safesearch, timelimit, max_results):
+        with DDGS() as ddgs:
+            return list(ddgs.text(query, region=region, safesearch=safesearch, timelimit=timelimit, max_results=max_results))
+
+
+class LocalIndexProvider(SearchProvider):
+    '''The offline FTS5 index (SEARCH_INDEX_PATH); build it with `python -m src.index`.'''
+
+    name = "local"
+    cacheable = False  # already local and faster than the cache; results carry full text
+
+    def search(self, query, region, safesearch, timelimit, max_results):
+        index = local_index()
+        if index is None:
+            raise RuntimeError("local search index not built (python -m src.index ...)")
+        return index.search(query, max_results)
+
+
+PROVIDERS = {"ddgs": DDGSProvider, "local": LocalIndexProvider}
+
+
+class FallbackProvider:
+    '''
+    Tries providers in order, each bounded by `timeout` seconds; an error, timeout or empty
+    result moves on to the next. Returns (results, provider that answered or None).
+    '''
+
+    def __init__(self, providers: list, timeout: float):
+        self.providers = providers
+        self.timeout = timeout
+
+    def search(self, attrs: dict, query, region, safesearch, timelimit, max_results):
+        errors = []
+        for provider in self.providers:
+            call = contextvars.copy_context().run
+            future = _CALLS.submit(call, provider.search, query, region, safesearch, timelimit, max_results)
+            try:
+                results = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                errors.append(f"{provider.name}: timed out after {self.timeout}s")
+                continue
+            except Exception as e:
+                errors.append(f"{provider.name}: {type(e).__name__}: {e}")
+                continue
+            if results:
+                if errors:
+                    attrs["errors"] = errors
+                return results, provider
+            errors.append(f"{provider.name}: no results")
+        if errors:
+            attrs["errors"] = errors
+        return [], None
+
+
+def get_provider(spec: str, timeout: float) -> FallbackProvider:
+    '''Provider chain for a comma-separated spec such as "local,ddgs" (shared per spec).'''
+    key = (spec, timeout)
+    with _PROVIDERS_LOCK:
+        if key not in _PROVIDERS:
+            names = [n.strip() for n in spec.split(",") if n.strip()] or ["ddgs"]
+            unknown = [n for n in names if n not in PROVIDERS]
+            if unknown:
+                raise ValueError(f"unknown search provider(s): {', '.join(unknown)} (available: {', '.join(PROVIDERS)})")
+            _PROVIDERS[key] = FallbackProvider([PROVIDERS[n]() for n in names], timeout)
+    return _PROVIDERS[key]
+
+
+def search_key(query: str, region: str, safesearch: str, timelimit: str, max_results: int, providers: str = "ddgs") -> str:
+    raw = json.dumps([normalize_query(query), region, safesearch, timelimit, max_results, providers])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cached_search(
+    query: str, region: str, safesearch: str, timelimit: str, max_results: int,
+    providers: str = "ddgs", timeout: float = 10,
+) -> Optional[list]:
+    cache = search_cache()
+    if cache is None:
+        return None
+    results = cache.get(search_key(query, region, safesearch, timelimit, max_results, providers))
+    if results is not None:
+        with span("search", "search", query=query, cached=True, results=len(results)):
+            pass
+    return results
+
+
+def search_web(
+    query: str, region: str, safesearch: str, timelimit: str, max_results: int,
+    providers: str = "ddgs", timeout: float = 10,
+) -> list:
+    '''
+    Searches through the SEARCH_PROVIDERS chain. Provider failures are recorded on the trace
+    span (attrs["errors"]); an empty list means every provider failed or found nothing.
+    '''
+    chain = get_provider(providers, timeout)
+    with span("search", "search", query=query, cached=False) as attrs:
+        results, provider = chain.search(attrs, query, region, safesearch, timelimit, max_results)
+        attrs["provider"] = provider.name if provider else None
+        attrs["results"] = len(results)
+
+    cache = search_cache()
+    # Empty result sets are usually rate limits or network errors, so don't pin them.
+    if cache is not None and results and provider.cacheable:
+        cache.put(search_key(query, region, safesearch, timelimit, max_results, providers), results)
+    return results
+
+
+async def asearch_web(
+    query: str, region: str, safesearch: str, timelimit: str, max_results: int,
+    providers: str = "ddgs", timeout: float = 10,
+) -> list:
+    # Providers are blocking; run them off the event loop so other sessions keep going.
+    return await asyncio.to_thread(search_web, query, region, safesearch, timelimit, max_results, providers, timeout)
+
+
+def search_many(queries: list[str], **params) -> list[list]:
+    '''Runs several live searches concurrently; returns one result list per query, in order.'''
+    if len(queries) <= 1:
+        return [search_web(q, **params) for q in queries]
+    with ThreadPoolExecutor(max_workers=len(queries), thread_name_prefix="search") as pool:
+        # Each worker runs in a copy of this context so its spans land in the caller's trace.
+        futures = [pool.submit(contextvars.copy_context().run, search_web, q, **params) for q in queries]
+        return [f.result() for f in futures]
+
+
+async def asearch_many(queries: list[str], **params) -> list[list]:
+    return list(await asyncio.gather(*(asearch_web(q, **params) for q in queries)))
@@ -0,0 +1,46 @@
+import re
+from typing import NamedTuple
+
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)[\s#]*$")
+_FENCE = "```"
+
+
+class Section(NamedTuple):
+    heading: str  # heading title without the #'s; "" for text before the first heading
+    start: int  # 1-based line number of the section's first line in the draft
+    text: str  # the heading line and body exactly as in the draft
+
+
+def split_sections(text: str) -> list:
+    '''
+    Splits a Markdown draft at its headings (any level, outside fenced code).
+    join_sections(split_sections(text)) == text.
+    '''
+    lines = (text or "").split("\n")
+    starts, in_code = [0], False
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith(_FENCE):
+            in_code = not in_code
+        elif not in_code and i and _HEADING.match(line):
+            starts.append(i)
+    starts.append(len(lines))
+
+    sections = []
+    for a, b in zip(starts, starts[1:]):
+        m = _HEADING.match(lines[a])
+        sections.append(Section(m.group(1) if m else "", a + 1, "\n".join(lines[a:b])))
+    return sections
+
+
+def join_sections(texts: list) -> str:
+    return "\n".join(texts)
+
+
+def section_at(sections: list, line: int) -> int:
+    '''Index of the section containing 1-based `line`.'''
+    index = 0
+    for i, section in enumerate(sections):
+        if section.start > line:
+            break
+        index = i
+    return index
@@ -7,32 +7,76 @@ class Source(TypedDict):
     url : str
     title : str
     snippet : str
-    content : str # Cached page text to avoid re-fetching
+    content_hash : str # fetched page text, kept in cache.content_store() rather than in the state
+    content_chars : int
+    simhash : int # fingerprint of the fetched text (None when too short to compare)
+    duplicate_of : str # id of the earlier source this one nearly duplicates; left out of prompts
 
 class BudgetState(TypedDict):
     search_calls : int
     pages_fetched : int
     token_estimate : int
+    trimmed_tokens : int # prompt tokens cut by the preflight check to fit context/budget
     stopped : bool
     reasons : List[str]
+    cache : Dict[str, Dict[str, int]] # e.g. {"pages": {"hit": 2, "miss": 3}}
 
 class AgentState(TypedDict):
     # Main state objects passed around the graph
     question : str
     plan : str
+    settings : Dict[str, Any] # per-run overrides (config.RUN_SETTINGS), kept so resumed runs get the same RunConfig
 
     # Research-related fields
     research_enabled : bool
     sources : List[Source]
     notes : str
+    source_digests : Dict[str, str] # source id -> compact extract (quoted by the draft prompt); marks sources already synthesized
 
     # Writing and Reflexion loops
     draft : str
     critique : str
+    gate_score : int # rule-based QualityGate result, computed alongside the LLM critique
+    gate_feedback : str
     revision : str
 
     # Loop control fields
     decision : Decision
     iteration : int
-    quality_score : int
-    budget : BudgetState
\ No newline at end of file
+    quality_score : float # min of the gate score and the critique's own quality_score
+    score_history : List[Dict[str, Any]] # one entry per review: scores, cumulative tokens, timestamp
+    stop_reason : str # why decide_node stopped: budget, score, max_iters, plateau or cost
+    prefetch : Dict[str, Any] # speculative next-iteration queries/searches/pages (nodes.prefetch_node)
+    budget : BudgetState
+
+def initial_state(question: str, research_enabled: bool, settings: Dict[str, Any] = None) -> AgentState:
+    # Fresh state for one research run (shared by the CLI, Streamlit app, batch runner and server).
+    return {
+        "question" : question,
+        "plan" : "",
+        "settings" : dict(settings or {}),
+        "research_enabled" : research_enabled,
+        "sources" : [],
+        "notes" : "",
+        "source_digests" : {},
+        "draft" : "",
+        "critique" : "",
+        "gate_score" : 0,
+        "gate_feedback" : "",
+        "revision" : "",
+        "decision" : "continue",
+        "iteration" : 0,
+        "quality_score" : 0,
+        "score_history" : [],
+        "stop_reason" : "",
+        "prefetch" : {},
+        "budget" : {
+            "search_calls" : 0,
+            "pages_fetched" : 0,
+            "token_estimate" : 0,
+            "trimmed_tokens" : 0,
+            "stopped" : False,
+            "reasons" : [],
+            "cache" : {}
+        }
+    }
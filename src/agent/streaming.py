@@ -0,0 +1,61 @@
+from typing import Any, Iterator, NamedTuple
+
+from .citations import CitationScanner, CitationStatus
+from .dedupe import distinct_sources
+
+# Nodes whose LLM output is the user-facing answer; only their tokens are streamed.
+TOKEN_NODES = ("draft", "revise")
+
+
+class StreamEvent(NamedTuple):
+    kind: str  # "node_start" | "node_end" | "token" | "done"
+    node: str = ""
+    text: str = ""
+    state: Any = None
+    citations: CitationStatus = None  # token/node_end events of TOKEN_NODES: citation check of the text so far
+
+
+def stream_run(graph, state, config: dict = None) -> Iterator[StreamEvent]:
+    '''
+    Run the graph with LangGraph's stream API and yield events as they happen:
+    node transitions, draft/revision tokens from ChatOllama, and the final state last.
+    A node answered from the LLM cache produces no tokens, so its whole output is
+    emitted as a single token event when it finishes.
+    Pass state=None with a checkpointed thread id in `config` to resume an interrupted run.
+    Streamed answer text is fed to a CitationScanner, so each token event also carries the
+    citation status of the answer so far (cited, dangling and uncited numeric claims).
+    '''
+    final = state
+    streamed = set()
+    scanners = {}
+    for mode, chunk in graph.stream(state, config, stream_mode=["tasks", "messages", "values"]):
+        if mode == "values":
+            final = chunk
+        elif mode == "tasks":
+            node = chunk["name"]
+            if "result" not in chunk:
+                streamed.discard(node)
+                if node in TOKEN_NODES:
+                    sources = distinct_sources((final or {}).get("sources") or [])
+                    scanners[node] = CitationScanner(s["id"] for s in sources)
+                yield StreamEvent("node_start", node)
+                continue
+            scanner = scanners.pop(node, None)
+            if node in TOKEN_NODES and node not in streamed:
+                out = dict(chunk["result"] or {})
+                text = out.get("revision" if node == "revise" else "draft", "")
+                if text and scanner:
+                    scanner.feed(text)
+                if text:
+                    yield StreamEvent("token", node, text, citations=scanner and scanner.status())
+            yield StreamEvent("node_end", node, citations=scanner and scanner.status())
+        elif mode == "messages":
+            message, meta = chunk
+            node = meta.get("langgraph_node", "")
+            if node in TOKEN_NODES and message.content:
+                streamed.add(node)
+                scanner = scanners.get(node)
+                if scanner:
+                    scanner.feed(message.content)
+                yield StreamEvent("token", node, message.content, citations=scanner and scanner.status())
+    yield StreamEvent("done", state=final)
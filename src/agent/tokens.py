@@ -0,0 +1,124 @@
+import math
+import threading
+from functools import lru_cache
+
+DEFAULT_CHARS_PER_TOKEN = 4.0
+# Observed ratios outside this range are ignored (e.g. Ollama reusing a cached prompt prefix
+# reports only the newly evaluated tokens).
+_RATIO_BOUNDS = (1.5, 8.0)
+_TRUNCATED = "\n[... truncated to fit the context window]"
+
+_COUNTERS = {}
+_COUNTERS_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def load_tokenizer(path: str):
+    '''A Hugging Face `tokenizers` tokenizer.json, loaded once; None if unavailable.'''
+    if not path:
+        return None
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        return None
+    try:
+        return Tokenizer.from_file(path)
+    except Exception:
+        return None
+
+
+class TokenCounter:
+    '''
+    Token counts for one model. Exact when a tokenizer file is configured (TOKENIZER_PATH);
+    otherwise a chars-per-token ratio calibrated from the prompt_eval_count Ollama reports
+    for every call (an exponential moving average, starting at 4 chars/token).
+    '''
+
+    def __init__(self, tokenizer=None, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN, smoothing: float = 0.3):
+        self.tokenizer = tokenizer
+        self.chars_per_token = chars_per_token
+        self.smoothing = smoothing
+        self.observations = 0
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return max(1, math.ceil(len(text) / self.chars_per_token))
+
+    def chars_for(self, tokens: int) -> int:
+        # Roughly how many characters make up `tokens` tokens (used when trimming).
+        return max(0, int(tokens * self.chars_per_token))
+
+    def observe(self, text: str, prompt_tokens: int):
+        '''Calibrate against the model's real prompt token count for `text`.'''
+        if self.tokenizer is not None or not text or not prompt_tokens:
+            return
+        ratio = len(text) / prompt_tokens
+        if not _RATIO_BOUNDS[0] <= ratio <= _RATIO_BOUNDS[1]:
+            return
+        with self._lock:
+            if self.observations == 0:
+                self.chars_per_token = ratio
+            else:
+                self.chars_per_token += self.smoothing * (ratio - self.chars_per_token)
+            self.observations += 1
+
+
+def token_counter(model: str, tokenizer_path: str = "") -> TokenCounter:
+    '''Process-wide counter per model, so calibration carries across runs.'''
+    key = (model, tokenizer_path)
+    counter = _COUNTERS.get(key)
+    if counter is None:
+        with _COUNTERS_LOCK:
+            counter = _COUNTERS.get(key)
+            if counter is None:
+                counter = _COUNTERS[key] = TokenCounter(load_tokenizer(tokenizer_path))
+    return counter
+
+
+def _cut(text: str, chars: int) -> str:
+    # Keep the head, preferably ending on a line boundary.
+    if chars <= 0:
+        return ""
+    head = text[:chars]
+    newline = head.rfind("\n")
+    if newline > chars * 0.8:
+        head = head[:newline]
+    return head
+
+
+def fit_parts(counter: TokenCounter, parts: list, limit: int) -> tuple[str, int]:
+    '''
+    Join prompt `parts` [(text, trimmable)] and, if the result exceeds `limit` tokens, shorten
+    the trimmable parts (largest first, keeping their beginning) until it fits or nothing is left
+    to trim. Returns (prompt, tokens trimmed).
+    '''
+    texts = [text for text, _ in parts]
+    sizes = [counter.count(t) for t in texts]
+    total = sum(sizes)
+    if total <= limit:
+        return "".join(texts), 0
+
+    trimmed = 0
+    over = total - limit
+    order = sorted((i for i, (_, trimmable) in enumerate(parts) if trimmable), key=lambda i: -sizes[i])
+    for i in order:
+        source = texts[i]
+        for _ in range(3):  # the chars/token estimate can be off; tighten a couple of times
+            if over <= 0:
+                break
+            keep = sizes[i] - over - counter.count(_TRUNCATED)
+            cut = _cut(source, min(len(source), counter.chars_for(keep)))
+            new_text = cut + _TRUNCATED if cut else _TRUNCATED.strip()
+            new_size = counter.count(new_text)
+            if new_size >= sizes[i]:
+                break
+            texts[i] = new_text
+            trimmed += sizes[i] - new_size
+            over -= sizes[i] - new_size
+            sizes[i] = new_size
+            source = cut
+    return "".join(texts), trimmed
@@ -0,0 +1,154 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Active tracer for the current run, and the innermost open span (so helpers can annotate it).
+_TRACER = contextvars.ContextVar("research_tracer", default=None)
+_SPAN = contextvars.ContextVar("research_span", default=None)
+
+
+class Tracer:
+    '''
+    Collects timed spans for one research run: graph nodes plus every LLM, search and fetch call.
+    Each span records wall time and free-form attributes (tokens, bytes, cache hits, retries, ...).
+    '''
+
+    def __init__(self, run_id: str = None):
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        # Total seconds and call count per span_key, slowest first.
+        totals = {}
+        for s in self.spans:
+            key = span_key(s)
+            secs, calls = totals.get(key, (0.0, 0))
+            totals[key] = (secs + s["dur_ms"] / 1000, calls + 1)
+        return dict(sorted(totals.items(), key=lambda kv: -kv[1][0]))
+
+    def export_jsonl(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for s in self.spans:
+                f.write(json.dumps({"run_id": self.run_id, **s}, ensure_ascii=False, default=str) + "\n")
+
+    def export_chrome(self, path: str):
+        # Chrome trace-event format: open in chrome://tracing or https://ui.perfetto.dev
+        lanes = {}
+        for s in self.spans:
+            lanes.setdefault(s["lane"], len(lanes) + 1)
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}}
+            for lane, tid in lanes.items()
+        ]
+        events += [
+            {
+                "name": s["name"],
+                "cat": s["kind"],
+                "ph": "X",
+                "ts": round(s["start_ms"] * 1000),
+                "dur": round(s["dur_ms"] * 1000),
+                "pid": 1,
+                "tid": lanes[s["lane"]],
+                "args": s["attrs"],
+            }
+            for s in self.spans
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "otherData": {"run_id": self.run_id}}, f, default=str)
+
+    def export(self, trace_dir: str) -> list[str]:
+        os.makedirs(trace_dir, exist_ok=True)
+        base = os.path.join(trace_dir, self.run_id)
+        self.export_jsonl(base + ".jsonl")
+        self.export_chrome(base + ".trace.json")
+        return [base + ".jsonl", base + ".trace.json"]
+
+
+def span_key(span: dict) -> str:
+    # "kind:name", plus the model for LLM calls so routed nodes report per-model latency.
+    key = f"{span['kind']}:{span['name']}"
+    model = span["attrs"].get("model")
+    return f"{key} [{model}]" if model else key
+
+
+def start_trace(run_id: str = None) -> Tracer:
+    '''Start tracing in the current context (thread / asyncio task) and return the tracer.'''
+    tracer = Tracer(run_id)
+    _TRACER.set(tracer)
+    return tracer
+
+
+def _lane() -> str:
+    # Async sessions share a thread, so lay spans out per asyncio task when there is one.
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return f"task-{id(task)}"
+    return threading.current_thread().name
+
+
+@contextmanager
+def span(name: str, kind: str, **attrs):
+    '''
+    Time a block. Yields the span's attribute dict so the body can add results to it.
+    A no-op (still yielding a dict) when no tracer is active.
+    '''
+    tracer = _TRACER.get()
+    if tracer is None:
+        yield dict(attrs)
+        return
+    record = {"name": name, "kind": kind, "lane": _lane(), "attrs": dict(attrs)}
+    token = _SPAN.set(record)
+    start = time.perf_counter()
+    try:
+        yield record["attrs"]
+    except BaseException as e:
+        record["attrs"]["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        end = time.perf_counter()
+        _SPAN.reset(token)
+        record["start_ms"] = (start - tracer.t0) * 1000
+        record["dur_ms"] = (end - start) * 1000
+        tracer.add(record)
+
+
+def annotate(**attrs):
+    '''Attach attributes to the innermost open span, if any.'''
+    record = _SPAN.get()
+    if record is not None:
+        record["attrs"].update(attrs)
+
+
+def count_retry(retry_state=None):
+    # tenacity `before_sleep` hook: count retries on the enclosing span.
+    record = _SPAN.get()
+    if record is not None:
+        record["attrs"]["retries"] = record["attrs"].get("retries", 0) + 1
+
+
+def llm_usage(message) -> dict:
+    '''Real token counts from the Ollama response when it reports them.'''
+    usage = getattr(message, "usage_metadata", None) or {}
+    meta = getattr(message, "response_metadata", None) or {}
+    out = {}
+    prompt = usage.get("input_tokens", meta.get("prompt_eval_count"))
+    completion = usage.get("output_tokens", meta.get("eval_count"))
+    if prompt is not None:
+        out["prompt_tokens"] = prompt
+    if completion is not None:
+        out["completion_tokens"] = completion
+    return out
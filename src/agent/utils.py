@@ -1,5 +1,4 @@
 import os
-import re
 import math
 import httpx
 
@@ -21,24 +20,6 @@ def rough_token_estimation(text: str) -> int:
         return 0
     return max(1, math.ceil(len(text)/4))
 
-def has_citation_markers(text: str) -> bool:
-    return bool(re.search(r"\[S\d+\]", text or ""))
-
-def find_numeric_claim_lines_without_cites(text: str) -> list[str]:
-    '''
-    Heuristic Quality Gate:
-    - If a line contains digits (year, stats, quantity) and research is enabled, requires at least one [S#] marker on that line.
-    '''
-
-    bad = []
-    for line in (text or "").splitlines():
-        if any (ch.isdigit for ch in line) and ("[S" not in line):
-            #ignore headings
-            if line.strip().startswith("#"):
-                continue
-            bad.append(line.strip())
-    return [b for b in bad if b]
-
 def check_ollama_health(base_url: str = None) -> bool:
     """Verifies if the Ollama server is responsive."""
     if base_url is None:
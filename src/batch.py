@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.agent.config import RunConfig, graph_config
+from src.agent.dedupe import distinct_sources
+from src.agent.graph import build_graph
+from src.agent.state import initial_state
+from src.agent.utils import check_ollama_health, env_int
+from src.agent.tracing import start_trace
+
+
+def load_questions(path: str) -> list[dict]:
+    '''
+    Reads questions from JSONL ({"question": ..., "id": optional}) or CSV (a `question` column,
+    optional `id`). Rows without an id get a stable hash of the question so runs can resume.
+    '''
+    rows = []
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    questions = []
+    for row in rows:
+        q = (row.get("question") or "").strip()
+        if not q:
+            continue
+        qid = str(row.get("id") or hashlib.sha1(q.encode("utf-8")).hexdigest()[:12])
+        questions.append({"id": qid, "question": q})
+    return questions
+
+
+def completed_ids(out_path: str) -> set[str]:
+    # Resume support: every question already answered successfully in the output file is skipped.
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a partially written last line from an interrupted run
+            if rec.get("status") == "ok":
+                done.add(rec["id"])
+    return done
+
+
+async def run_batch(questions: list[dict], out_path: str, workers: int, research_enabled: bool) -> list[float]:
+    '''
+    Answers questions concurrently on one event loop, at most `workers` at a time.
+    All runs share the compiled graph, the pooled HTTP client and the caches.
+    Each result is appended to `out_path` as soon as it finishes. Returns per-question latencies.
+    '''
+    graph = build_graph()
+    config = graph_config(RunConfig.from_env())
+    sem = asyncio.Semaphore(workers)
+    latencies = []
+    trace_dir = os.getenv("TRACE_DIR", "")
+
+    with open(out_path, "a", encoding="utf-8") as out:
+
+        async def one(item):
+            async with sem:
+                t0 = time.perf_counter()
+                rec = {"id": item["id"], "question": item["question"]}
+                # Each gathered coroutine runs in its own task/context, so traces don't mix.
+                tracer = start_trace(f"batch-{item['id']}") if trace_dir else None
+                try:
+                    state = await graph.ainvoke(initial_state(item["question"], research_enabled), config)
+                    rec.update({
+                        "status": "ok",
+                        "answer": state.get("draft") or state.get("revision") or "",
+                        "sources": [{"id": s["id"], "title": s["title"], "url": s["url"]} for s in distinct_sources(state.get("sources", []))],
+                        "iterations": state.get("iteration", 0),
+                        "quality_score": state.get("quality_score", 0),
+                        "stop_reason": state.get("stop_reason", ""),
+                        "budget": state.get("budget", {}),
+                    })
+                except Exception as e:
+                    rec.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+                rec["latency_secs"] = round(time.perf_counter() - t0, 3)
+                if tracer:
+                    tracer.export(trace_dir)
+                if rec["status"] == "ok":
+                    latencies.append(rec["latency_secs"])
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                out.flush()
+                print(f"[{rec['status']}] {item['id']} ({rec['latency_secs']}s)", flush=True)
+
+        await asyncio.gather(*(one(item) for item in questions))
+    return latencies
+
+
+def print_stats(latencies: list[float], total: int, wall: float):
+    ok = len(latencies)
+    print("\n----- BATCH -----")
+    print(f"questions: {total}  ok: {ok}  failed: {total - ok}  wall: {wall:.1f}s")
+    if not ok:
+        return
+    ordered = sorted(latencies)
+    p95 = ordered[min(ok - 1, int(round(0.95 * (ok - 1))))]
+    print(f"throughput: {ok / wall * 60:.2f} questions/min")
+    print(
+        f"latency: mean {statistics.mean(ordered):.1f}s  p50 {statistics.median(ordered):.1f}s  "
+        f"p95 {p95:.1f}s  max {ordered[-1]:.1f}s"
+    )
+
+
+def main():
+    load_dotenv(find_dotenv(usecwd=True), override=True)
+
+    parser = argparse.ArgumentParser(description="Answer a file of questions (JSONL or CSV) in parallel.")
+    parser.add_argument("input", help="questions file (.jsonl with a `question` field, or .csv with a `question` column)")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="results file (JSONL, appended; default: results.jsonl)")
+    parser.add_argument("-w", "--workers", type=int, default=env_int("BATCH_WORKERS", 4), help="concurrent research runs")
+    args = parser.parse_args()
+
+    if not check_ollama_health():
+        print("\n[!] Error: Ollama server is not reachable.")
+        print("Please ensure Ollama is running (check your system tray or run 'ollama serve').")
+        sys.exit(1)
+
+    questions = load_questions(args.input)
+    done = completed_ids(args.output)
+    todo = [q for q in questions if q["id"] not in done]
+    if len(todo) < len(questions):
+        print(f"Resuming: {len(questions) - len(todo)} of {len(questions)} already answered in {args.output}")
+
+    t0 = time.perf_counter()
+    latencies = asyncio.run(run_batch(todo, args.output, max(1, args.workers), os.getenv("RESEARCH_ENABLED", "1") == "1"))
+    print_stats(latencies, len(todo), time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,37 @@
+import argparse
 import os
 import sys
 
 from dotenv import load_dotenv, find_dotenv
 
+from src.agent.checkpoint import checkpointer, finish_run, new_thread_id, pending_nodes, saved_state
+from src.agent.config import RunConfig, graph_config
+from src.agent.dedupe import distinct_sources
 from src.agent.graph import build_graph
-from src.agent.state import AgentState
+from src.agent.state import AgentState, initial_state
 from src.agent.utils import check_ollama_health
+from src.agent.streaming import stream_run
+from src.agent.tracing import start_trace
+
+def run_streaming(graph, state, config=None):
+    # Print node transitions and draft/revision tokens as they arrive.
+    out = state
+    for ev in stream_run(graph, state, config):
+        if ev.kind == "node_start":
+            print(f"\n[{ev.node}] ...", flush=True)
+        elif ev.kind == "token":
+            print(ev.text, end="", flush=True)
+        elif ev.kind == "node_end" and ev.citations:
+            c = ev.citations
+            print(
+                f"\n[{ev.node}] cited: {', '.join(c.cited_ids) or 'none'}"
+                f" | dangling: {', '.join(c.dangling_ids) or 'none'} | uncited numeric claims: {c.uncited_numeric}",
+                flush=True,
+            )
+        elif ev.kind == "done":
+            out = ev.state
+    print()
+    return out
 
 def main():
 
@@ -18,40 +44,55 @@ def main():
         print("If it's already running, check OLLAMA_BASE_URL in your .env file.")
         sys.exit(1)
 
-    graph = build_graph()
+    parser = argparse.ArgumentParser(description="Ask the research agent a question.")
+    parser.add_argument("question", nargs="*", help="question (prompted for when omitted)")
+    parser.add_argument("--resume", metavar="RUN_ID", help="continue an interrupted run from its last completed node")
+    args = parser.parse_args()
 
-    if len(sys.argv) > 1:
-        question = "".join(sys.argv[1:])                #For question(s) mentioned in command-line
-    
+    graph = build_graph(checkpointer())
+
+    if args.resume:
+        pending = pending_nodes(graph, args.resume)
+        if pending is None:
+            print(f"[!] No checkpoint found for run {args.resume} (is CHECKPOINT_ENABLED=1?)")
+            sys.exit(1)
+        if not pending:
+            print(f"Run {args.resume} already finished; showing its result.")
+        else:
+            print(f"Resuming run {args.resume} at: {', '.join(pending)}")
+        thread_id, state = args.resume, None             # None input = continue from the checkpoint
     else:
-        question = input("Question: ").strip()          #For interactive behaviour
-
-    state : AgentState = {
-        "question" : question,
-        "plan" : "",
-        "research_enabled" : os.getenv("RESEARCH_ENABLED", "1") == "1",
-        "sources" : [],
-        "notes" : "",
-        "draft" : "",
-        "critique" : "",
-        "revision" : "",
-        "decision" : "continue",
-        "iteration" : 0,
-        "quality_score" : 0,
-        'budget' : {
-            "search_calls" : 0,
-            "pages_fetched" : 0,
-            "token_estimate" : 0,
-            "stopped" : False,
-            "reasons" : []
-        }
-    }
-
-    out = graph.invoke(state)
+        if args.question:
+            question = " ".join(args.question)          #For question(s) mentioned in command-line
+        else:
+            question = input("Question: ").strip()      #For interactive behaviour
+        thread_id = new_thread_id()
+        state : AgentState = initial_state(question, os.getenv("RESEARCH_ENABLED", "1") == "1")
+
+    # Resolved once for the whole run; a resumed run reuses the settings saved in its state.
+    run = RunConfig.from_env(state["settings"] if state else saved_state(graph, thread_id).get("settings"))
+    config = graph_config(run, thread_id if graph.checkpointer else None)
+    if graph.checkpointer and not args.resume:
+        print(f"Run id: {thread_id} (if interrupted, continue with: --resume {thread_id})")
+
+    trace_dir = os.getenv("TRACE_DIR", "")
+    tracer = start_trace(thread_id) if trace_dir else None
+
+    try:
+        if args.resume and not pending:
+            out = graph.get_state(config).values
+        elif os.getenv("STREAM_OUTPUT", "1") == "1":
+            out = run_streaming(graph, state, config)
+        else:
+            out = graph.invoke(state, config)
+    except (Exception, KeyboardInterrupt):
+        if graph.checkpointer:
+            print(f"\n[!] Run interrupted. Continue it with: python -m src.cli --resume {thread_id}")
+        raise
 
     final_text = out.get("draft") or out.get("revision") or ""
 
-    sources = out.get("sources", [])
+    sources = distinct_sources(out.get("sources", []))
     if sources:
         refs = "\n".join([f"- [{s['id']}] {s['title']} — {s['url']}" for s in sources])
         final_text += "\n\n## References\n" + refs
@@ -62,6 +103,16 @@ def main():
 
     print("\n----- BUDGET -----")
     print(out["budget"])
+    print(f"Stopped after {out['iteration']} iteration(s): {out.get('stop_reason') or '-'}")
+
+    if tracer:
+        print("\n----- TRACE -----")
+        for key, (secs, calls) in tracer.summary().items():
+            print(f"{key:<40} {secs:8.2f}s  x{calls}")
+        print("Written:", ", ".join(tracer.export(trace_dir)))
+
+    if graph.checkpointer:
+        finish_run(graph, thread_id)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.agent.cache import page_cache
+from src.agent.index import LocalIndex, iter_directory, iter_page_cache
+from src.agent.utils import env_int
+
+
+def main():
+    load_dotenv(find_dotenv(usecwd=True), override=True)
+
+    parser = argparse.ArgumentParser(description="Build the offline search index used by SEARCH_PROVIDERS=local.")
+    parser.add_argument("--path", default=os.getenv("SEARCH_INDEX_PATH", ".cache/index.sqlite"), help="index file (default: SEARCH_INDEX_PATH)")
+    parser.add_argument("--max-chars", type=int, default=env_int("SEARCH_INDEX_MAX_CHARS", 200000), help="characters kept per document")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add_dir = sub.add_parser("add-dir", help="index .txt/.md/.rst/.html files under a directory")
+    add_dir.add_argument("directory")
+    sub.add_parser("from-page-cache", help="index every page in the page cache (PAGE_CACHE_PATH)")
+    args = parser.parse_args()
+
+    index = LocalIndex(args.path)
+    if args.command == "add-dir":
+        if not os.path.isdir(args.directory):
+            print(f"[!] Not a directory: {args.directory}")
+            sys.exit(1)
+        added = index.add_many(iter_directory(args.directory, args.max_chars))
+    else:
+        cache = page_cache()
+        if cache is None:
+            print("[!] The page cache is disabled (PAGE_CACHE_ENABLED=0).")
+            sys.exit(1)
+        added = index.add_many((url, title, text[:args.max_chars]) for url, title, text in iter_page_cache(cache))
+    print(f"Indexed {added} documents; {index.count()} in {args.path}")
+
+
+if __name__ == "__main__":
+    main()
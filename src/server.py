@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.agent.graph import build_graph
+from src.agent.config import RunConfig, graph_config, parse_bool
+from src.agent.dedupe import distinct_sources
+from src.agent.state import initial_state
+from src.agent.utils import check_ollama_health, env_int
+from src.agent.tracing import start_trace
+
+
+class JobQueue:
+    '''
+    Bounded job queue drained by a fixed pool of worker threads that share one compiled graph
+    (and with it the model client, pooled HTTP client and caches).
+    submit() refuses work once `max_queued` jobs are waiting, so callers get backpressure
+    instead of unbounded latency. Finished jobs are kept for polling, oldest dropped first.
+    '''
+
+    def __init__(self, graph, workers: int, max_queued: int, max_jobs: int = 1000):
+        self.graph = graph
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.running = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(workers)
+        ]
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+
+    def submit(self, question: str, research_enabled: bool, settings: dict):
+        '''Returns the queued job, or None when the queue is full.'''
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "queued",
+            "question": question,
+            "research_enabled": research_enabled,
+            "settings": settings,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            try:
+                self._queue.put_nowait(job["id"])
+            except queue.Full:
+                return None
+            self.jobs[job["id"]] = job
+            self._trim()
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "queued": self._queue.qsize(),
+                "max_queued": self._queue.maxsize,
+            }
+
+    def _trim(self):
+        # Drop the oldest finished jobs once more than max_jobs are tracked.
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in [j for j, job in self.jobs.items() if job["status"] in ("done", "error")][:max(0, excess)]:
+            del self.jobs[job_id]
+
+    def _work(self):
+        trace_dir = os.getenv("TRACE_DIR", "")
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                job.update(status="running", started_at=time.time())
+                self.running += 1
+
+            tracer = start_trace(f"job-{job_id}") if trace_dir else None
+            try:
+                config = graph_config(RunConfig.from_env(job["settings"]))
+                state = self.graph.invoke(
+                    initial_state(job["question"], job["research_enabled"], job["settings"]), config
+                )
+                update = {
+                    "status": "done",
+                    "result": {
+                        "answer": state.get("draft") or state.get("revision") or "",
+                        "sources": [{"id": s["id"], "title": s["title"], "url": s["url"]} for s in distinct_sources(state.get("sources", []))],
+                        "iterations": state.get("iteration", 0),
+                        "quality_score": state.get("quality_score", 0),
+                        "stop_reason": state.get("stop_reason", ""),
+                        "budget": state.get("budget", {}),
+                    },
+                }
+            except Exception as e:
+                update = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+            if tracer:
+                tracer.export(trace_dir)
+
+            with self._lock:
+                job.update(update, finished_at=time.time())
+                self.running -= 1
+
+
+def parse_job(body: dict):
+    '''Validates a POST /jobs body. Returns (question, research_enabled, settings) or raises ValueError.'''
+    question = str(body.get("question") or "").strip()
+    if not question:
+        raise ValueError("`question` is required")
+    research_enabled = body.get("research_enabled")
+    if research_enabled is None:
+        research_enabled = os.getenv("RESEARCH_ENABLED", "1") == "1"
+    try:
+        research_enabled = parse_bool(research_enabled)
+    except ValueError:
+        raise ValueError("`research_enabled` must be a boolean")
+    settings = body.get("settings") or {}
+    if not isinstance(settings, dict):
+        raise ValueError("`settings` must be an object")
+    RunConfig.from_env(settings)  # rejects unknown keys and bad values up front
+    return question, research_enabled, settings
+
+
+def make_handler(jobs: JobQueue):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                return self._send(200, {"status": "ok", **jobs.stats()})
+            if self.path.startswith("/jobs/"):
+                job = jobs.get(self.path[len("/jobs/"):])
+                if job is None:
+                    return self._send(404, {"error": "unknown job id"})
+                return self._send(200, job)
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                return self._send(404, {"error": "not found"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("request body must be a JSON object")
+                question, research_enabled, settings = parse_job(body)
+            except (ValueError, json.JSONDecodeError) as e:
+                return self._send(400, {"error": str(e)})
+
+            job = jobs.submit(question, research_enabled, settings)
+            if job is None:
+                return self._send(
+                    429,
+                    {"error": "queue full, retry later", **jobs.stats()},
+                    {"Retry-After": os.getenv("SERVER_RETRY_AFTER_SECS", "30")},
+                )
+            self._send(202, {"id": job["id"], "status": job["status"]}, {"Location": f"/jobs/{job['id']}"})
+
+        def log_message(self, fmt, *args):
+            if os.getenv("SERVER_ACCESS_LOG", "0") == "1":
+                super().log_message(fmt, *args)
+
+    return Handler
+
+
+def main():
+    load_dotenv(find_dotenv(usecwd=True), override=True)
+
+    parser = argparse.ArgumentParser(description="Serve the research agent over HTTP with a bounded job queue.")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=env_int("SERVER_PORT", 8080))
+    parser.add_argument("-w", "--workers", type=int, default=env_int("SERVER_WORKERS", 2), help="concurrent research runs")
+    parser.add_argument("-q", "--max-queued", type=int, default=env_int("SERVER_MAX_QUEUED", 16), help="jobs waiting before 429")
+    args = parser.parse_args()
+
+    if not check_ollama_health():
+        print("\n[!] Error: Ollama server is not reachable.")
+        print("Please ensure Ollama is running (check your system tray or run 'ollama serve').")
+        sys.exit(1)
+
+    from src.agent.nodes import warm_clients
+
+    warm_clients(RunConfig.from_env())
+    jobs = JobQueue(build_graph(), max(1, args.workers), max(1, args.max_queued), env_int("SERVER_MAX_JOBS", 1000))
+    jobs.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(jobs))
+    print(f"Serving on http://{args.host}:{args.port} ({args.workers} workers, queue {args.max_queued})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()